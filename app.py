@@ -2,617 +2,89 @@
 
 from flask import Flask, render_template_string, request, jsonify, redirect, url_for, session
 from flask_socketio import SocketIO, emit, join_room, leave_room
-from flask_sqlalchemy import SQLAlchemy
-from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
-from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import datetime
+from flask_login import LoginManager, login_user, logout_user, login_required, current_user
+from eventlet.greenthread import GreenThread
+from contextlib import contextmanager
+from functools import wraps
+import hmac
 import os
+import eventlet
+import migrations
+import settings
+from diagnostics import HubMonitor
+from message_cache import MessageCache
+from shards import MessageShards
+from connections import ConnectionTracker, count_queued_bytes, queued_bytes
+from models import db, User, Message, parse_user_id
+from templates import LOGIN_TEMPLATE, CHAT_TEMPLATE
 
 app = Flask(__name__)
-app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'your-secret-key-change-in-production')
-app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///chat.db')
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config.update(settings.from_env())
 
-db = SQLAlchemy(app)
-socketio = SocketIO(app, cors_allowed_origins="*", async_mode='eventlet')
+db.init_app(app)
+socketio = SocketIO(
+    app,
+    cors_allowed_origins="*",
+    async_mode='eventlet',
+    ping_interval=app.config['SOCKET_PING_INTERVAL'],
+    ping_timeout=app.config['SOCKET_PING_TIMEOUT']
+)
+count_queued_bytes(socketio.server.eio)
 login_manager = LoginManager(app)
 login_manager.login_view = 'login'
 
-# Database Models
-class User(UserMixin, db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    username = db.Column(db.String(80), unique=True, nullable=False)
-    password_hash = db.Column(db.String(200), nullable=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    
-    def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
-    
-    def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
-
-class Message(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    sender_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    receiver_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    content = db.Column(db.Text, nullable=False)
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
-    read = db.Column(db.Boolean, default=False)
-    
-    sender = db.relationship('User', foreign_keys=[sender_id], backref='sent_messages')
-    receiver = db.relationship('User', foreign_keys=[receiver_id], backref='received_messages')
+# Opt-in hub blocking detector and sampling profiler (DIAGNOSTICS=1)
+hub_monitor = HubMonitor(
+    threshold=app.config['BLOCKING_THRESHOLD_MS'] / 1000,
+    interval=app.config['PROFILE_INTERVAL_MS'] / 1000
+) if app.config['DIAGNOSTICS'] else None
+
+# Recent messages of active conversations, served without a database query
+message_cache = MessageCache(
+    max_conversations=app.config['MESSAGE_CACHE_CONVERSATIONS'],
+    per_conversation=app.config['MESSAGE_CACHE_SIZE'],
+    max_bytes=app.config['MESSAGE_CACHE_MAX_MB'] * 1024 * 1024
+)
+
+# Open sockets per user, capped at MAX_SOCKETS_PER_USER (oldest evicted first)
+connection_tracker = ConnectionTracker(
+    max_per_user=app.config['MAX_SOCKETS_PER_USER'],
+    idle_timeout=app.config['SOCKET_IDLE_TIMEOUT']
+)
 
 @login_manager.user_loader
 def load_user(user_id):
     return db.session.get(User, int(user_id))
 
-# HTML Templates
-LOGIN_TEMPLATE = '''
-<!DOCTYPE html>
-<html lang="en">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>ChatApp - Login</title>
-    <style>
-        * { margin: 0; padding: 0; box-sizing: border-box; }
-        body {
-            font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
-            background: linear-gradient(135deg, #128C7E 0%, #25D366 100%);
-            height: 100vh;
-            display: flex;
-            align-items: center;
-            justify-content: center;
-        }
-        .login-container {
-            background: white;
-            padding: 40px;
-            border-radius: 15px;
-            box-shadow: 0 10px 40px rgba(0,0,0,0.2);
-            width: 400px;
-        }
-        h2 {
-            color: #128C7E;
-            margin-bottom: 30px;
-            text-align: center;
-            font-size: 28px;
-        }
-        .form-group {
-            margin-bottom: 20px;
-        }
-        label {
-            display: block;
-            margin-bottom: 8px;
-            color: #333;
-            font-weight: 500;
-        }
-        input {
-            width: 100%;
-            padding: 12px;
-            border: 1px solid #ddd;
-            border-radius: 8px;
-            font-size: 14px;
-            outline: none;
-            transition: border 0.3s;
-        }
-        input:focus {
-            border-color: #25D366;
-        }
-        button {
-            width: 100%;
-            padding: 12px;
-            background: #25D366;
-            color: white;
-            border: none;
-            border-radius: 8px;
-            font-size: 16px;
-            font-weight: 600;
-            cursor: pointer;
-            transition: background 0.3s;
-        }
-        button:hover {
-            background: #20ba5a;
-        }
-        .switch-form {
-            text-align: center;
-            margin-top: 20px;
-            color: #666;
-        }
-        .switch-form a {
-            color: #128C7E;
-            text-decoration: none;
-            font-weight: 600;
-        }
-        .error {
-            background: #fee;
-            color: #c33;
-            padding: 10px;
-            border-radius: 5px;
-            margin-bottom: 20px;
-        }
-    </style>
-</head>
-<body>
-    <div class="login-container">
-        <h2>{% if register %}Register{% else %}Login{% endif %} to ChatApp</h2>
-        {% if error %}
-        <div class="error">{{ error }}</div>
-        {% endif %}
-        <form method="POST">
-            <div class="form-group">
-                <label>Username</label>
-                <input type="text" name="username" required>
-            </div>
-            <div class="form-group">
-                <label>Password</label>
-                <input type="password" name="password" required>
-            </div>
-            <button type="submit">{% if register %}Register{% else %}Login{% endif %}</button>
-        </form>
-        <div class="switch-form">
-            {% if register %}
-            Already have an account? <a href="{{ url_for('login') }}">Login here</a>
-            {% else %}
-            Don't have an account? <a href="{{ url_for('register') }}">Register here</a>
-            {% endif %}
-        </div>
-    </div>
-</body>
-</html>
-'''
-
-CHAT_TEMPLATE = '''
-<!DOCTYPE html>
-<html lang="en">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>ChatApp Web</title>
-    <script src="https://cdn.socket.io/4.5.4/socket.io.min.js"></script>
-    <style>
-        * { margin: 0; padding: 0; box-sizing: border-box; }
-        body {
-            font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
-            background: white;
-            height: 100vh;
-            overflow: hidden;
-        }
-        .container { display: flex; height: 100vh; }
-        
-        /* Sidebar */
-        .sidebar {
-            width: 380px;
-            border-right: 1px solid #e0e0e0;
-            display: flex;
-            flex-direction: column;
-            background: #f8f9fa;
-        }
-        .sidebar-header {
-            background: #ededed;
-            padding: 15px;
-            display: flex;
-            justify-content: space-between;
-            align-items: center;
-            border-bottom: 1px solid #d1d1d1;
-        }
-        .sidebar-header h2 {
-            color: #111;
-            font-size: 18px;
-        }
-        .user-info {
-            display: flex;
-            align-items: center;
-            gap: 10px;
-        }
-        .logout-btn {
-            background: #dc3545;
-            color: white;
-            border: none;
-            padding: 6px 12px;
-            border-radius: 5px;
-            cursor: pointer;
-            font-size: 12px;
-        }
-        .search-box {
-            padding: 10px;
-            background: white;
-            border-bottom: 1px solid #e0e0e0;
-        }
-        .search-box input {
-            width: 100%;
-            padding: 10px;
-            border: 1px solid #e0e0e0;
-            border-radius: 20px;
-            outline: none;
-        }
-        .online-users {
-            flex: 1;
-            overflow-y: auto;
-            background: white;
-        }
-        .user-item {
-            padding: 15px;
-            border-bottom: 1px solid #f0f0f0;
-            cursor: pointer;
-            display: flex;
-            align-items: center;
-            transition: background 0.2s;
-        }
-        .user-item:hover { background: #f5f5f5; }
-        .user-item.active { background: #ebebeb; }
-        .avatar {
-            width: 50px;
-            height: 50px;
-            border-radius: 50%;
-            background: linear-gradient(135deg, #25D366, #128C7E);
-            display: flex;
-            align-items: center;
-            justify-content: center;
-            color: white;
-            font-weight: bold;
-            font-size: 20px;
-            margin-right: 15px;
-        }
-        .user-info-text {
-            flex: 1;
-        }
-        .username {
-            font-weight: 600;
-            color: #111;
-            margin-bottom: 3px;
-        }
-        .status {
-            font-size: 12px;
-            color: #25D366;
-        }
-        .unread-badge {
-            background: #25D366;
-            color: white;
-            border-radius: 50%;
-            width: 20px;
-            height: 20px;
-            display: flex;
-            align-items: center;
-            justify-content: center;
-            font-size: 11px;
-            font-weight: bold;
-        }
-        
-        /* Chat Area */
-        .chat-area {
-            flex: 1;
-            display: flex;
-            flex-direction: column;
-        }
-        .welcome-screen {
-            flex: 1;
-            display: flex;
-            align-items: center;
-            justify-content: center;
-            flex-direction: column;
-            color: #667781;
-        }
-        .welcome-screen h2 {
-            font-size: 32px;
-            margin-bottom: 10px;
-            color: #111;
-        }
-        #chatContainer {
-            display: none;
-            flex: 1;
-            flex-direction: column;
-        }
-        .chat-header {
-            background: #ededed;
-            padding: 15px;
-            display: flex;
-            align-items: center;
-            justify-content: space-between;
-            border-bottom: 1px solid #d1d1d1;
-        }
-        .chat-header-left {
-            display: flex;
-            align-items: center;
-        }
-        .chat-header-info h3 {
-            color: #111;
-            font-size: 16px;
-        }
-        .typing-indicator {
-            font-size: 12px;
-            color: #667781;
-            font-style: italic;
-        }
-        .messages-area {
-            flex: 1;
-            overflow-y: auto;
-            padding: 20px;
-            background: #e5ddd5;
-            background-image: url("data:image/svg+xml,%3Csvg width='60' height='60' viewBox='0 0 60 60' xmlns='http://www.w3.org/2000/svg'%3E%3Cg fill='none' fill-rule='evenodd'%3E%3Cg fill='%23d4cdc6' fill-opacity='0.3'%3E%3Cpath d='M36 34v-4h-2v4h-4v2h4v4h2v-4h4v-2h-4zm0-30V0h-2v4h-4v2h4v4h2V6h4V4h-4zM6 34v-4H4v4H0v2h4v4h2v-4h4v-2H6zM6 4V0H4v4H0v2h4v4h2V6h4V4H6z'/%3E%3C/g%3E%3C/g%3E%3C/svg%3E");
-        }
-        .message {
-            margin-bottom: 15px;
-            display: flex;
-            animation: fadeIn 0.3s;
-        }
-        @keyframes fadeIn {
-            from { opacity: 0; transform: translateY(10px); }
-            to { opacity: 1; transform: translateY(0); }
-        }
-        .message.sent { justify-content: flex-end; }
-        .message-bubble {
-            max-width: 60%;
-            padding: 10px 15px;
-            border-radius: 8px;
-            box-shadow: 0 1px 2px rgba(0,0,0,0.1);
-        }
-        .message.received .message-bubble { background: white; }
-        .message.sent .message-bubble { background: #d9fdd3; }
-        .message-text {
-            color: #111;
-            font-size: 14px;
-            line-height: 1.5;
-            margin-bottom: 3px;
-            word-wrap: break-word;
-        }
-        .message-time {
-            font-size: 11px;
-            color: #667781;
-            text-align: right;
-        }
-        .input-area {
-            background: #f0f0f0;
-            padding: 15px;
-            display: flex;
-            align-items: center;
-            gap: 10px;
-        }
-        .input-area input {
-            flex: 1;
-            padding: 12px;
-            border: 1px solid #e0e0e0;
-            border-radius: 25px;
-            outline: none;
-            font-size: 14px;
-        }
-        .send-btn {
-            background: #25D366;
-            color: white;
-            border: none;
-            padding: 10px 20px;
-            border-radius: 25px;
-            cursor: pointer;
-            font-size: 14px;
-            font-weight: 500;
-        }
-        .send-btn:hover { background: #20ba5a; }
-    </style>
-</head>
-<body>
-    <div class="container">
-        <div class="sidebar">
-            <div class="sidebar-header">
-                <h2>ChatsApp</h2>
-                <div class="user-info">
-                    <span style="color: #111; font-weight: 600;">{{ current_user.username }}</span>
-                    <button class="logout-btn" onclick="logout()">Logout</button>
-                </div>
-            </div>
-            
-            <div class="search-box">
-                <input type="text" placeholder="Search users..." id="searchInput" oninput="filterUsers()">
-            </div>
-            
-            <div class="online-users" id="usersList"></div>
-        </div>
-        
-        <div class="chat-area">
-            <div id="welcomeScreen" class="welcome-screen">
-                <h2>Welcome to ChatApp</h2>
-                <p>Select a user to start chatting</p>
-            </div>
-            
-            <div id="chatContainer">
-                <div class="chat-header">
-                    <div class="chat-header-left">
-                        <div class="avatar" id="chatHeaderAvatar"></div>
-                        <div class="chat-header-info">
-                            <h3 id="chatHeaderName"></h3>
-                            <div class="typing-indicator" id="typingIndicator" style="display:none;">typing...</div>
-                        </div>
-                    </div>
-                </div>
-                
-                <div class="messages-area" id="messagesArea"></div>
-                
-                <div class="input-area">
-                    <input type="text" placeholder="Type a message" id="messageInput" onkeypress="handleKeyPress(event)" oninput="handleTyping()">
-                    <button class="send-btn" onclick="sendMessage()">Send</button>
-                </div>
-            </div>
-        </div>
-    </div>
-    
-    <script>
-        const socket = io();
-        const currentUserId = {{ current_user.id }};
-        const currentUsername = "{{ current_user.username }}";
-        let selectedUserId = null;
-        let typingTimeout = null;
-        
-        socket.on('connect', () => {
-            console.log('Connected to server');
-            loadUsers();
-        });
-        
-        socket.on('user_list', (data) => {
-            displayUsers(data.users);
-        });
-        
-        socket.on('receive_message', (data) => {
-            if (data.sender_id === selectedUserId || data.receiver_id === selectedUserId) {
-                displayNewMessage(data);
-            }
-            loadUsers(); // Refresh user list to update last messages
-        });
-        
-        socket.on('user_typing', (data) => {
-            if (data.user_id === selectedUserId) {
-                document.getElementById('typingIndicator').style.display = 'block';
-            }
-        });
-        
-        socket.on('user_stopped_typing', (data) => {
-            if (data.user_id === selectedUserId) {
-                document.getElementById('typingIndicator').style.display = 'none';
-            }
-        });
-        
-        function displayUsers(users) {
-            const usersList = document.getElementById('usersList');
-            usersList.innerHTML = '';
-            
-            users.forEach(user => {
-                if (user.id !== currentUserId) {
-                    const userItem = document.createElement('div');
-                    userItem.className = 'user-item' + (user.id === selectedUserId ? ' active' : '');
-                    userItem.onclick = () => selectUser(user.id, user.username);
-                    
-                    const initial = user.username.charAt(0).toUpperCase();
-                    let unreadBadge = user.unread_count > 0 ? `<div class="unread-badge">${user.unread_count}</div>` : '';
-                    
-                    userItem.innerHTML = `
-                        <div class="avatar">${initial}</div>
-                        <div class="user-info-text">
-                            <div class="username">${user.username}</div>
-                            <div class="status">online</div>
-                        </div>
-                        ${unreadBadge}
-                    `;
-                    
-                    usersList.appendChild(userItem);
-                }
-            });
-        }
-        
-        function loadUsers() {
-            fetch('/api/users')
-                .then(r => r.json())
-                .then(data => displayUsers(data.users));
-        }
-        
-        async function selectUser(userId, username) {
-            selectedUserId = userId;
-            
-            document.getElementById('welcomeScreen').style.display = 'none';
-            document.getElementById('chatContainer').style.display = 'flex';
-            
-            const initial = username.charAt(0).toUpperCase();
-            document.getElementById('chatHeaderAvatar').textContent = initial;
-            document.getElementById('chatHeaderName').textContent = username;
-            
-            // Mark messages as read
-            await fetch('/api/mark_read', {
-                method: 'POST',
-                headers: {'Content-Type': 'application/json'},
-                body: JSON.stringify({user_id: userId})
-            });
-            
-            loadMessages(userId);
-            loadUsers(); // Refresh to clear unread badges
-            
-            document.querySelectorAll('.user-item').forEach(item => {
-                item.classList.remove('active');
-            });
-            event.target.closest('.user-item').classList.add('active');
-        }
-        
-        function loadMessages(userId) {
-            fetch(`/api/messages/${userId}`)
-                .then(r => r.json())
-                .then(data => {
-                    const messagesArea = document.getElementById('messagesArea');
-                    messagesArea.innerHTML = '';
-                    
-                    data.messages.forEach(msg => {
-                        displayNewMessage(msg);
-                    });
-                    
-                    messagesArea.scrollTop = messagesArea.scrollHeight;
-                });
-        }
-        
-        function displayNewMessage(msg) {
-            const messagesArea = document.getElementById('messagesArea');
-            const messageDiv = document.createElement('div');
-            const isSent = msg.sender_id === currentUserId;
-            
-            messageDiv.className = `message ${isSent ? 'sent' : 'received'}`;
-            messageDiv.innerHTML = `
-                <div class="message-bubble">
-                    <div class="message-text">${escapeHtml(msg.content)}</div>
-                    <div class="message-time">${msg.time}</div>
-                </div>
-            `;
-            
-            messagesArea.appendChild(messageDiv);
-            messagesArea.scrollTop = messagesArea.scrollHeight;
-        }
-        
-        function sendMessage() {
-            const input = document.getElementById('messageInput');
-            const text = input.value.trim();
-            
-            if (!text || !selectedUserId) return;
-            
-            socket.emit('send_message', {
-                receiver_id: selectedUserId,
-                content: text
-            });
-            
-            input.value = '';
-        }
-        
-        function handleKeyPress(event) {
-            if (event.key === 'Enter') {
-                sendMessage();
-            }
-        }
-        
-        function handleTyping() {
-            if (!selectedUserId) return;
-            
-            socket.emit('typing', {receiver_id: selectedUserId});
-            
-            clearTimeout(typingTimeout);
-            typingTimeout = setTimeout(() => {
-                socket.emit('stopped_typing', {receiver_id: selectedUserId});
-            }, 1000);
-        }
-        
-        function filterUsers() {
-            const searchText = document.getElementById('searchInput').value.toLowerCase();
-            const userItems = document.querySelectorAll('.user-item');
-            
-            userItems.forEach(item => {
-                const username = item.querySelector('.username').textContent.toLowerCase();
-                item.style.display = username.includes(searchText) ? 'flex' : 'none';
-            });
-        }
-        
-        function logout() {
-            window.location.href = '/logout';
-        }
-        
-        function escapeHtml(text) {
-            const div = document.createElement('div');
-            div.textContent = text;
-            return div.innerHTML;
-        }
-    </script>
-</body>
-</html>
-'''
+# Optional conversation-sharded message storage (MESSAGE_SHARDS > 1)
+message_shards = MessageShards.from_config(app.config, app.instance_path, Message)
+
+@contextmanager
+def message_session(user_a, user_b):
+    # The conversation's shard, or the app database when sharding is off
+    if message_shards is None:
+        yield db.session
+    else:
+        with message_shards.session(user_a, user_b) as s:
+            yield s
+
+def unread_counts(receiver_id):
+    if message_shards is not None:
+        return message_shards.unread_counts(receiver_id)
+    rows = db.session.query(Message.sender_id, db.func.count()).filter_by(
+        receiver_id=receiver_id,
+        read=False
+    ).group_by(Message.sender_id)
+    return dict(rows.all())
+
+def admin_required(view):
+    @wraps(view)
+    @login_required
+    def wrapped(*args, **kwargs):
+        if current_user.id not in app.config['ADMIN_USER_IDS']:
+            return jsonify({'error': 'Forbidden'}), 403
+        return view(*args, **kwargs)
+    return wrapped
 
 # Routes
 @app.route('/')
@@ -672,25 +144,24 @@ def logout():
 @app.route('/chat')
 @login_required
 def chat():
-    return render_template_string(CHAT_TEMPLATE)
+    return render_template_string(
+        CHAT_TEMPLATE,
+        message_limit=app.config['MESSAGE_CACHE_SIZE'],
+        idle_timeout=app.config['SOCKET_IDLE_TIMEOUT']
+    )
 
 @app.route('/api/users')
 @login_required
 def get_users():
     users = User.query.all()
+    unread = unread_counts(current_user.id)
     user_list = []
     
     for user in users:
-        unread_count = Message.query.filter_by(
-            receiver_id=current_user.id,
-            sender_id=user.id,
-            read=False
-        ).count()
-        
         user_list.append({
             'id': user.id,
             'username': user.username,
-            'unread_count': unread_count
+            'unread_count': unread.get(user.id, 0)
         })
     
     return jsonify({'users': user_list})
@@ -698,71 +169,172 @@ def get_users():
 @app.route('/api/messages/<int:user_id>')
 @login_required
 def get_messages(user_id):
-    messages = Message.query.filter(
-        ((Message.sender_id == current_user.id) & (Message.receiver_id == user_id)) |
-        ((Message.sender_id == user_id) & (Message.receiver_id == current_user.id))
-    ).order_by(Message.timestamp).all()
+    # Optional ?limit=N returns only the latest N messages, and ?before=<id>
+    # only those older than that message, to page back through history
+    limit = request.args.get('limit', type=int)
+    if limit is not None and limit <= 0:
+        limit = None
+    before = request.args.get('before', type=int)
     
-    message_list = [{
-        'id': msg.id,
-        'sender_id': msg.sender_id,
-        'receiver_id': msg.receiver_id,
-        'content': msg.content,
-        'time': msg.timestamp.strftime('%I:%M %p')
-    } for msg in messages]
+    if before is None:
+        cached = message_cache.get(current_user.id, user_id, limit)
+        if cached is not None:
+            return jsonify({'messages': cached})
+    
+    seq = message_cache.write_seq()
+    with message_session(current_user.id, user_id) as s:
+        conversation = s.query(Message).filter(
+            ((Message.sender_id == current_user.id) & (Message.receiver_id == user_id)) |
+            ((Message.sender_id == user_id) & (Message.receiver_id == current_user.id))
+        )
+        if before is not None:
+            conversation = conversation.filter(Message.id < before)
+        
+        if limit is None:
+            messages = conversation.order_by(Message.timestamp).all()
+            complete = True
+        else:
+            # Fetch at least a full buffer so the cache can serve later reads
+            fetch = limit if before is not None else max(limit, app.config['MESSAGE_CACHE_SIZE'])
+            messages = conversation.order_by(Message.timestamp.desc()).limit(fetch).all()[::-1]
+            complete = len(messages) < fetch
+        
+        message_list = [msg.to_dict() for msg in messages]
     
+    # Older pages are not the conversation's tail, so they never fill the cache
+    if before is None:
+        message_cache.fill(current_user.id, user_id, message_list, complete, seq)
+    
+    if limit is not None:
+        message_list = message_list[-limit:]
     return jsonify({'messages': message_list})
 
 @app.route('/api/mark_read', methods=['POST'])
 @login_required
 def mark_read():
     data = request.json
-    user_id = data.get('user_id')
-    
-    Message.query.filter_by(
-        receiver_id=current_user.id,
-        sender_id=user_id,
-        read=False
-    ).update({'read': True})
+    user_id = parse_user_id(data.get('user_id'))
+    if user_id is None:
+        # Nothing to mark
+        return jsonify({'success': True})
     
-    db.session.commit()
+    with message_session(current_user.id, user_id) as s:
+        s.query(Message).filter_by(
+            receiver_id=current_user.id,
+            sender_id=user_id,
+            read=False
+        ).update({'read': True})
+        s.commit()
     return jsonify({'success': True})
 
+@app.route('/admin/cache')
+@admin_required
+def cache_stats():
+    return jsonify(message_cache.stats())
+
+@app.route('/admin/connections')
+@admin_required
+def connection_stats():
+    return jsonify(connection_report())
+
+def connection_report():
+    # Connections, and the MAX_SOCKETS_PER_USER cap, are tracked per process.
+    # Under launcher.py each worker has its own; /launcher/health combines them.
+    report = connection_tracker.report(lambda sid: queued_bytes(socketio.server, sid))
+    report['pid'] = os.getpid()
+    report['ping_interval'] = app.config['SOCKET_PING_INTERVAL']
+    report['ping_timeout'] = app.config['SOCKET_PING_TIMEOUT']
+    return report
+
+@app.route('/healthz')
+def healthz():
+    status = {'status': 'ok', 'pid': os.getpid()}
+    token = app.config['LAUNCHER_TOKEN']
+    if token and hmac.compare_digest(request.headers.get('X-Launcher-Token', ''), token):
+        status['sockets'] = connection_report()
+    return jsonify(status)
+
+# Admin diagnostics
+@app.route('/admin/diagnostics/blocking')
+@admin_required
+def diagnostics_blocking():
+    if hub_monitor is None:
+        return jsonify({'error': 'Diagnostics disabled'}), 404
+    return jsonify(hub_monitor.blocking_report())
+
+@app.route('/admin/diagnostics/profile')
+@admin_required
+def diagnostics_profile():
+    if hub_monitor is None:
+        return jsonify({'error': 'Diagnostics disabled'}), 404
+    folded = hub_monitor.folded_stacks(reset=request.args.get('reset') == '1')
+    return app.response_class(folded, mimetype='text/plain', headers={
+        'Content-Disposition': 'attachment; filename=profile.folded'
+    })
+
 # SocketIO Events
+def close_socket(sid, reason):
+    # Tell the client why before disconnecting, since Socket.IO clients do not
+    # reconnect on their own after a server-side disconnect
+    socketio.server.emit('session_closed', {'reason': reason}, to=sid, namespace='/', ignore_queue=True)
+    socketio.server.disconnect(sid, namespace='/')
+
+def reap_idle_connections():
+    while True:
+        socketio.sleep(connection_tracker.reap_interval())
+        for sid in connection_tracker.idle():
+            close_socket(sid, 'idle')
+
 @socketio.on('connect')
 def handle_connect():
+    if connection_tracker.draining:
+        return False
+    
+    if connection_tracker.idle_timeout > 0 and not connection_tracker.reaper_started:
+        connection_tracker.reaper_started = True
+        socketio.start_background_task(reap_idle_connections)
+    
+    user_id = current_user.id if current_user.is_authenticated else None
+    for sid in connection_tracker.add(request.sid, user_id):
+        close_socket(sid, 'evicted')
+    
     if current_user.is_authenticated:
         join_room(f'user_{current_user.id}')
         emit('user_list', {'users': []}, broadcast=True)
 
 @socketio.on('disconnect')
 def handle_disconnect():
+    connection_tracker.remove(request.sid)
     if current_user.is_authenticated:
         leave_room(f'user_{current_user.id}')
 
+@socketio.on('active')
+def handle_active():
+    # Sent by the chat page on user activity, so readers are not idle
+    connection_tracker.touch(request.sid)
+
 @socketio.on('send_message')
 def handle_send_message(data):
+    connection_tracker.touch(request.sid)
     if not current_user.is_authenticated:
         return
     
-    receiver_id = data.get('receiver_id')
+    receiver_id = parse_user_id(data.get('receiver_id'))
     content = data.get('content')
+    if receiver_id is None:
+        return
     
     message = Message(
         sender_id=current_user.id,
         receiver_id=receiver_id,
         content=content
     )
-    db.session.add(message)
-    db.session.commit()
+    with message_session(current_user.id, receiver_id) as s:
+        s.add(message)
+        s.commit()
+        message_data = message.to_dict()
     
-    message_data = {
-        'id': message.id,
-        'sender_id': current_user.id,
-        'receiver_id': receiver_id,
-        'content': content,
-        'time': message.timestamp.strftime('%I:%M %p')
-    }
+    message_cache.append(message.sender_id, message.receiver_id, message_data)
     
     # Send to both users
     emit('receive_message', message_data, room=f'user_{current_user.id}')
@@ -770,6 +342,7 @@ def handle_send_message(data):
 
 @socketio.on('typing')
 def handle_typing(data):
+    connection_tracker.touch(request.sid)
     if not current_user.is_authenticated:
         return
     
@@ -778,6 +351,7 @@ def handle_typing(data):
 
 @socketio.on('stopped_typing')
 def handle_stopped_typing(data):
+    connection_tracker.touch(request.sid)
     if not current_user.is_authenticated:
         return
     
@@ -785,12 +359,36 @@ def handle_stopped_typing(data):
     emit('user_stopped_typing', {'user_id': current_user.id}, room=f'user_{receiver_id}')
 
 # Initialize database
-with app.app_context():
-    db.create_all()
+# Runs once per process on first use instead of at import time, so importing
+# this module never touches the database. launcher.py migrates once before
+# starting workers and sets SCHEMA_READY so they skip it.
+_schema_ready = os.environ.get('SCHEMA_READY') == '1'
+
+def init_db():
+    global _schema_ready
+    if not _schema_ready:
+        with app.app_context():
+            migrations.upgrade(db.engine, db.metadata)
+            if message_shards is not None:
+                message_shards.upgrade()
+        _schema_ready = True
+
+def init_diagnostics():
+    if hub_monitor is not None:
+        hub_monitor.start()
+
+@app.before_request
+def ensure_started():
+    init_db()
+    # The hub monitor only makes sense when serving from the eventlet hub
+    if isinstance(eventlet.getcurrent(), GreenThread):
+        init_diagnostics()
 
 if __name__ == '__main__':
+    init_db()
+    init_diagnostics()
     # For Windows production: python app.py
-    # For Linux production: gunicorn -k eventlet -w 1 app:app
+    # For Linux production: python run_production.py (supervised workers, see launcher.py)
     # Change port if 5000 is in use (try 8000, 8080, 3000, etc.)
     port = int(os.environ.get('PORT', 8000))
     print(f"\n🚀 Starting ChatApp Clone on http://localhost:{port}")
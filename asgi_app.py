@@ -0,0 +1,422 @@
+import asyncio
+import os
+from functools import wraps
+from http.cookies import SimpleCookie
+
+import socketio
+from itsdangerous import BadSignature
+from quart import Quart, g, jsonify, redirect, render_template_string, request, session, url_for
+from sqlalchemy import create_engine, func, select, update
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from werkzeug.security import generate_password_hash
+
+import migrations
+import settings
+from connections import AsyncSendQueue, ConnectionTracker, count_queued_bytes, queued_bytes
+from message_cache import MessageCache
+from models import db, parse_user_id, User, Message
+from shards import MessageShards, database_url
+from templates import LOGIN_TEMPLATE, CHAT_TEMPLATE
+
+# Asyncio serving mode: the same routes and Socket.IO events as app.py,
+# served by an ASGI server with an async database driver and no eventlet.
+#   uvicorn asgi_app:application --host 0.0.0.0 --port 8000
+
+ASYNC_DRIVERS = {
+    'sqlite': 'sqlite+aiosqlite',
+    'postgresql': 'postgresql+asyncpg',
+}
+
+quart_app = Quart(__name__)
+quart_app.config.update(settings.from_env())
+config = quart_app.config
+
+sio = socketio.AsyncServer(
+    async_mode='asgi',
+    cors_allowed_origins='*',
+    ping_interval=config['SOCKET_PING_INTERVAL'],
+    ping_timeout=config['SOCKET_PING_TIMEOUT']
+)
+count_queued_bytes(sio.eio, AsyncSendQueue)
+application = socketio.ASGIApp(sio, quart_app)
+
+message_cache = MessageCache(
+    max_conversations=config['MESSAGE_CACHE_CONVERSATIONS'],
+    per_conversation=config['MESSAGE_CACHE_SIZE'],
+    max_bytes=config['MESSAGE_CACHE_MAX_MB'] * 1024 * 1024
+)
+
+connection_tracker = ConnectionTracker(
+    max_per_user=config['MAX_SOCKETS_PER_USER'],
+    idle_timeout=config['SOCKET_IDLE_TIMEOUT']
+)
+
+# Same files as app.py: relative SQLite paths resolve to the instance folder
+DATABASE_URL = database_url(config['SQLALCHEMY_DATABASE_URI'], quart_app.instance_path)
+message_shards = MessageShards.from_config(config, quart_app.instance_path, Message)
+
+Session = None
+# One sessionmaker per message shard when MESSAGE_SHARDS > 1
+ShardSessions = None
+
+
+def async_sessionmaker_for(url):
+    url = url.set(drivername=ASYNC_DRIVERS.get(url.drivername, url.drivername))
+    return async_sessionmaker(create_async_engine(url), expire_on_commit=False)
+
+
+def init_db():
+    engine = create_engine(DATABASE_URL)
+    try:
+        migrations.upgrade(engine, db.metadata)
+    finally:
+        engine.dispose()
+    if message_shards is not None:
+        message_shards.upgrade()
+
+
+@quart_app.before_serving
+async def startup():
+    global Session, ShardSessions
+    await asyncio.to_thread(init_db)
+    Session = async_sessionmaker_for(DATABASE_URL)
+    if message_shards is not None:
+        ShardSessions = [async_sessionmaker_for(engine.url) for engine in message_shards.engines]
+
+
+def message_session(user_a, user_b):
+    # The conversation's shard, or the app database when sharding is off
+    if ShardSessions is None:
+        return Session()
+    return ShardSessions[message_shards.shard_for(user_a, user_b)]()
+
+
+async def load_user(user_id):
+    async with Session() as s:
+        return await s.get(User, int(user_id))
+
+
+def login_required(view):
+    @wraps(view)
+    async def wrapped(*args, **kwargs):
+        user_id = session.get('_user_id')
+        g.current_user = await load_user(user_id) if user_id else None
+        if g.current_user is None:
+            return redirect(url_for('login'))
+        return await view(*args, **kwargs)
+    return wrapped
+
+
+def admin_required(view):
+    @wraps(view)
+    @login_required
+    async def wrapped(*args, **kwargs):
+        if g.current_user.id not in config['ADMIN_USER_IDS']:
+            return jsonify({'error': 'Forbidden'}), 403
+        return await view(*args, **kwargs)
+    return wrapped
+
+
+def login_session(user):
+    # Same keys as Flask-Login, so sessions work in either serving mode
+    session['_user_id'] = str(user.id)
+    session['_fresh'] = True
+
+
+# Routes
+@quart_app.route('/')
+async def index():
+    if '_user_id' in session:
+        return redirect(url_for('chat'))
+    return redirect(url_for('login'))
+
+
+@quart_app.route('/login', methods=['GET', 'POST'])
+async def login():
+    if '_user_id' in session:
+        return redirect(url_for('chat'))
+
+    error = None
+    if request.method == 'POST':
+        form = await request.form
+        async with Session() as s:
+            user = await s.scalar(select(User).filter_by(username=form.get('username')))
+
+        # Password hashing is CPU bound; keep it off the event loop
+        if user and await asyncio.to_thread(user.check_password, form.get('password')):
+            login_session(user)
+            return redirect(url_for('chat'))
+        else:
+            error = 'Invalid username or password'
+
+    return await render_template_string(LOGIN_TEMPLATE, error=error, register=False)
+
+
+@quart_app.route('/register', methods=['GET', 'POST'])
+async def register():
+    if '_user_id' in session:
+        return redirect(url_for('chat'))
+
+    error = None
+    if request.method == 'POST':
+        form = await request.form
+        username = form.get('username')
+        async with Session() as s:
+            if await s.scalar(select(User).filter_by(username=username)):
+                error = 'Username already exists'
+            else:
+                password_hash = await asyncio.to_thread(generate_password_hash, form.get('password'))
+                user = User(username=username, password_hash=password_hash)
+                s.add(user)
+                await s.commit()
+                login_session(user)
+                return redirect(url_for('chat'))
+
+    return await render_template_string(LOGIN_TEMPLATE, error=error, register=True)
+
+
+@quart_app.route('/logout')
+@login_required
+async def logout():
+    session.pop('_user_id', None)
+    session.pop('_fresh', None)
+    return redirect(url_for('login'))
+
+
+@quart_app.route('/chat')
+@login_required
+async def chat():
+    return await render_template_string(
+        CHAT_TEMPLATE,
+        current_user=g.current_user,
+        message_limit=config['MESSAGE_CACHE_SIZE'],
+        idle_timeout=config['SOCKET_IDLE_TIMEOUT']
+    )
+
+
+@quart_app.route('/api/users')
+@login_required
+async def get_users():
+    async def fetch_users():
+        async with Session() as s:
+            return (await s.scalars(select(User))).all()
+
+    async def fetch_unread_counts(sessionmaker):
+        async with sessionmaker() as s:
+            rows = await s.execute(
+                select(Message.sender_id, func.count())
+                .where(Message.receiver_id == g.current_user.id, Message.read == False)
+                .group_by(Message.sender_id)
+            )
+            return dict(rows.all())
+
+    # Users and every shard's unread counts are queried concurrently
+    users, *counts = await asyncio.gather(
+        fetch_users(),
+        *[fetch_unread_counts(sessionmaker) for sessionmaker in ShardSessions or [Session]]
+    )
+    unread = {}
+    for shard_counts in counts:
+        unread.update(shard_counts)
+    user_list = [{
+        'id': user.id,
+        'username': user.username,
+        'unread_count': unread.get(user.id, 0)
+    } for user in users]
+
+    return jsonify({'users': user_list})
+
+
+@quart_app.route('/api/messages/<int:user_id>')
+@login_required
+async def get_messages(user_id):
+    me = g.current_user.id
+    limit = request.args.get('limit', type=int)
+    if limit is not None and limit <= 0:
+        limit = None
+    before = request.args.get('before', type=int)
+
+    if before is None:
+        cached = message_cache.get(me, user_id, limit)
+        if cached is not None:
+            return jsonify({'messages': cached})
+
+    seq = message_cache.write_seq()
+    query = select(Message).where(
+        ((Message.sender_id == me) & (Message.receiver_id == user_id)) |
+        ((Message.sender_id == user_id) & (Message.receiver_id == me))
+    )
+    if before is not None:
+        query = query.where(Message.id < before)
+
+    async with message_session(me, user_id) as s:
+        if limit is None:
+            messages = (await s.scalars(query.order_by(Message.timestamp))).all()
+            complete = True
+        else:
+            fetch = limit if before is not None else max(limit, config['MESSAGE_CACHE_SIZE'])
+            messages = (await s.scalars(query.order_by(Message.timestamp.desc()).limit(fetch))).all()[::-1]
+            complete = len(messages) < fetch
+
+    message_list = [msg.to_dict() for msg in messages]
+    if before is None:
+        message_cache.fill(me, user_id, message_list, complete, seq)
+
+    if limit is not None:
+        message_list = message_list[-limit:]
+    return jsonify({'messages': message_list})
+
+
+@quart_app.route('/api/mark_read', methods=['POST'])
+@login_required
+async def mark_read():
+    data = await request.get_json()
+    user_id = parse_user_id(data.get('user_id'))
+    if user_id is None:
+        # Nothing to mark
+        return jsonify({'success': True})
+
+    async with message_session(g.current_user.id, user_id) as s:
+        await s.execute(
+            update(Message)
+            .where(Message.receiver_id == g.current_user.id, Message.sender_id == user_id, Message.read == False)
+            .values(read=True)
+        )
+        await s.commit()
+    return jsonify({'success': True})
+
+
+@quart_app.route('/admin/cache')
+@admin_required
+async def cache_stats():
+    return jsonify(message_cache.stats())
+
+
+@quart_app.route('/admin/connections')
+@admin_required
+async def connection_stats():
+    report = connection_tracker.report(lambda sid: queued_bytes(sio, sid))
+    report['pid'] = os.getpid()
+    report['ping_interval'] = config['SOCKET_PING_INTERVAL']
+    report['ping_timeout'] = config['SOCKET_PING_TIMEOUT']
+    return jsonify(report)
+
+
+@quart_app.route('/healthz')
+async def healthz():
+    return jsonify({'status': 'ok', 'pid': os.getpid()})
+
+
+# SocketIO Events
+def session_user_id(environ):
+    cookie = SimpleCookie(environ.get('HTTP_COOKIE', ''))
+    name = quart_app.config['SESSION_COOKIE_NAME']
+    if name not in cookie:
+        return None
+    serializer = quart_app.session_interface.get_signing_serializer(quart_app)
+    try:
+        data = serializer.loads(
+            cookie[name].value,
+            max_age=int(quart_app.permanent_session_lifetime.total_seconds())
+        )
+    except BadSignature:
+        return None
+    user_id = data.get('_user_id')
+    return int(user_id) if user_id else None
+
+
+async def current_user_id(sid):
+    return (await sio.get_session(sid)).get('user_id')
+
+
+async def close_socket(sid, reason):
+    # Tell the client why before disconnecting, since Socket.IO clients do not
+    # reconnect on their own after a server-side disconnect
+    await sio.emit('session_closed', {'reason': reason}, to=sid)
+    await sio.disconnect(sid)
+
+
+async def reap_idle_connections():
+    while True:
+        await sio.sleep(connection_tracker.reap_interval())
+        for sid in connection_tracker.idle():
+            await close_socket(sid, 'idle')
+
+
+@sio.event
+async def connect(sid, environ):
+    if connection_tracker.idle_timeout > 0 and not connection_tracker.reaper_started:
+        connection_tracker.reaper_started = True
+        sio.start_background_task(reap_idle_connections)
+
+    user_id = session_user_id(environ)
+    for old_sid in connection_tracker.add(sid, user_id):
+        await close_socket(old_sid, 'evicted')
+
+    if user_id is not None:
+        await sio.save_session(sid, {'user_id': user_id})
+        await sio.enter_room(sid, f'user_{user_id}')
+        await sio.emit('user_list', {'users': []})
+
+
+@sio.event
+async def disconnect(sid):
+    connection_tracker.remove(sid)
+
+
+@sio.event
+async def active(sid):
+    connection_tracker.touch(sid)
+
+
+@sio.event
+async def send_message(sid, data):
+    connection_tracker.touch(sid)
+    user_id = await current_user_id(sid)
+    receiver_id = parse_user_id(data.get('receiver_id'))
+    if user_id is None or receiver_id is None:
+        return
+
+    message = Message(
+        sender_id=user_id,
+        receiver_id=receiver_id,
+        content=data.get('content')
+    )
+    async with message_session(message.sender_id, message.receiver_id) as s:
+        s.add(message)
+        await s.commit()
+
+    message_data = message.to_dict()
+    message_cache.append(message.sender_id, message.receiver_id, message_data)
+
+    # Send to both users
+    await asyncio.gather(
+        sio.emit('receive_message', message_data, room=f'user_{message.sender_id}'),
+        sio.emit('receive_message', message_data, room=f'user_{message.receiver_id}')
+    )
+
+
+@sio.event
+async def typing(sid, data):
+    connection_tracker.touch(sid)
+    user_id = await current_user_id(sid)
+    if user_id is None:
+        return
+    await sio.emit('user_typing', {'user_id': user_id}, room=f"user_{data.get('receiver_id')}")
+
+
+@sio.event
+async def stopped_typing(sid, data):
+    connection_tracker.touch(sid)
+    user_id = await current_user_id(sid)
+    if user_id is None:
+        return
+    await sio.emit('user_stopped_typing', {'user_id': user_id}, room=f"user_{data.get('receiver_id')}")
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    port = int(os.environ.get('PORT', 8000))
+    print(f"\n🚀 Starting ChatApp Clone (asyncio) on http://localhost:{port}")
+    uvicorn.run(application, host='0.0.0.0', port=port)
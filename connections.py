@@ -0,0 +1,177 @@
+import time
+from collections import Counter
+
+# Rough memory held by an idle connection (greenlet or task, socket buffers,
+# Engine.IO and Socket.IO session state), in bytes. A fixed estimate; only the
+# send queues below are measured.
+CONNECTION_OVERHEAD = 48 * 1024
+
+# Connections listed by queued bytes in the report
+TOP_QUEUED = 5
+
+AGE_BUCKETS = [
+    (60, '<1m'),
+    (600, '1-10m'),
+    (3600, '10-60m'),
+    (6 * 3600, '1-6h'),
+    (None, '>6h'),
+]
+
+
+def packet_size(packet):
+    # None is the queue's close marker
+    return 0 if packet is None else len(packet.encode())
+
+
+class SendQueue:
+    """Engine.IO send queue that counts the bytes waiting in it.
+
+    Packets are added on ``put`` and subtracted when the transport takes them
+    with ``get`` to write them out; everything else goes to the wrapped queue.
+    """
+
+    def __init__(self, queue):
+        self._queue = queue
+        self.bytes = 0
+
+    def __getattr__(self, name):
+        return getattr(self._queue, name)
+
+    def put(self, packet, *args, **kwargs):
+        self.bytes += packet_size(packet)
+        self._queue.put(packet, *args, **kwargs)
+
+    def put_nowait(self, packet):
+        self.bytes += packet_size(packet)
+        self._queue.put_nowait(packet)
+
+    def get(self, *args, **kwargs):
+        packet = self._queue.get(*args, **kwargs)
+        self.bytes -= packet_size(packet)
+        return packet
+
+    def get_nowait(self):
+        packet = self._queue.get_nowait()
+        self.bytes -= packet_size(packet)
+        return packet
+
+
+class AsyncSendQueue(SendQueue):
+    """SendQueue for asyncio.Queue, whose ``put`` and ``get`` are coroutines."""
+
+    async def put(self, packet):
+        self.bytes += packet_size(packet)
+        await self._queue.put(packet)
+
+    async def get(self):
+        packet = await self._queue.get()
+        self.bytes -= packet_size(packet)
+        return packet
+
+
+def count_queued_bytes(eio, queue_class=SendQueue):
+    # Every Engine.IO socket gets its send queue from create_queue(), so
+    # wrapping it counts each socket's packets from the first one
+    create_queue = eio.create_queue
+    eio.create_queue = lambda *args, **kwargs: queue_class(create_queue(*args, **kwargs))
+
+
+def queued_bytes(server, sid, namespace='/'):
+    # Bytes in the connection's send queue, counted by SendQueue. Websocket
+    # queues drain almost at once; lasting non-zero values point at slow
+    # long-polling clients or a blocked hub.
+    eio_sid = server.manager.eio_sid_from_sid(sid, namespace)
+    socket = server.eio.sockets.get(eio_sid)
+    return getattr(getattr(socket, 'queue', None), 'bytes', 0)
+
+
+class ConnectionTracker:
+    """Tracks open Socket.IO connections per user.
+
+    ``add`` enforces the per-user socket cap and returns the sids of the
+    oldest connections to disconnect; ``idle`` returns connections with no
+    client events for longer than the idle timeout.
+    """
+
+    def __init__(self, max_per_user=10, idle_timeout=0):
+        self.max_per_user = max_per_user
+        self.idle_timeout = idle_timeout
+        self.connections = {}
+        self.by_user = {}
+        self.evicted = 0
+        self.idle_disconnects = 0
+        self.reaper_started = False
+        # Set while a worker shuts down, to refuse new connections
+        self.draining = False
+
+    def add(self, sid, user_id):
+        now = time.time()
+        self.connections[sid] = {'user_id': user_id, 'connected_at': now, 'last_seen': now}
+        if user_id is None:
+            return []
+        sids = self.by_user.setdefault(user_id, [])
+        sids.append(sid)
+        evict = []
+        if self.max_per_user > 0:
+            while len(sids) > self.max_per_user:
+                evict.append(sids.pop(0))
+        for old_sid in evict:
+            self.connections.pop(old_sid, None)
+        self.evicted += len(evict)
+        return evict
+
+    def touch(self, sid):
+        connection = self.connections.get(sid)
+        if connection is not None:
+            connection['last_seen'] = time.time()
+
+    def remove(self, sid):
+        connection = self.connections.pop(sid, None)
+        if connection is None or connection['user_id'] is None:
+            return
+        sids = self.by_user.get(connection['user_id'], [])
+        if sid in sids:
+            sids.remove(sid)
+        if not sids:
+            self.by_user.pop(connection['user_id'], None)
+
+    def idle(self):
+        if self.idle_timeout <= 0:
+            return []
+        cutoff = time.time() - self.idle_timeout
+        sids = [sid for sid, c in self.connections.items() if c['last_seen'] < cutoff]
+        for sid in sids:
+            self.remove(sid)
+        self.idle_disconnects += len(sids)
+        return sids
+
+    def reap_interval(self):
+        return max(1, min(self.idle_timeout / 2, 30))
+
+    def report(self, queued=None):
+        now = time.time()
+        ages = Counter()
+        for connection in self.connections.values():
+            age = now - connection['connected_at']
+            ages[next(label for limit, label in AGE_BUCKETS if limit is None or age < limit)] += 1
+
+        queues = {sid: queued(sid) for sid in list(self.connections)} if queued else {}
+        total_queued = sum(queues.values())
+        top = sorted((sid for sid, size in queues.items() if size > 0), key=queues.get, reverse=True)
+        return {
+            'connections': len(self.connections),
+            'users': len(self.by_user),
+            'anonymous': sum(1 for c in self.connections.values() if c['user_id'] is None),
+            'sockets_per_user': dict(sorted(Counter(len(s) for s in self.by_user.values()).items())),
+            'age': {label: ages[label] for _, label in AGE_BUCKETS},
+            'queued_bytes': total_queued,
+            'top_queued': [
+                {'sid': sid, 'user_id': self.connections[sid]['user_id'], 'bytes': queues[sid]}
+                for sid in top[:TOP_QUEUED]
+            ],
+            'estimated_memory_bytes': len(self.connections) * CONNECTION_OVERHEAD + total_queued,
+            'max_sockets_per_user': self.max_per_user,
+            'idle_timeout': self.idle_timeout,
+            'evicted': self.evicted,
+            'idle_disconnects': self.idle_disconnects,
+        }
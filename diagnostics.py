@@ -0,0 +1,107 @@
+import os
+import sys
+import traceback
+from collections import Counter, deque
+from datetime import datetime
+
+import eventlet
+from eventlet import patcher
+
+# Real OS threads and locks, even when eventlet has monkey-patched the process
+_thread = patcher.original('_thread')
+_threading = patcher.original('threading')
+_time = patcher.original('time')
+
+MAX_BLOCKING_EVENTS = 100
+MAX_UNIQUE_STACKS = 10000
+
+
+class HubMonitor:
+    """Watches the eventlet hub from a native thread.
+
+    A greenlet on the hub records a heartbeat; if the heartbeat falls behind
+    by more than ``threshold`` seconds the hub is blocked and the stack running
+    on the hub thread is recorded. The same thread samples that stack every
+    ``interval`` seconds into folded stacks for flamegraph.pl / speedscope.
+    """
+
+    def __init__(self, threshold=0.1, interval=0.01):
+        self.threshold = threshold
+        self.interval = interval
+        self.blocking_events = deque(maxlen=MAX_BLOCKING_EVENTS)
+        self.samples = Counter()
+        self.started_at = None
+        self._hub_ident = None
+        self._last_beat = 0.0
+        self._current_block = None
+        self._lock = _threading.Lock()
+
+    def start(self):
+        if self.started_at is not None:
+            return
+        self.started_at = datetime.utcnow()
+        self._hub_ident = _thread.get_ident()
+        self._last_beat = _time.monotonic()
+        eventlet.spawn(self._heartbeat)
+        watchdog = _threading.Thread(target=self._watch, name='hub-monitor', daemon=True)
+        watchdog.start()
+
+    def _heartbeat(self):
+        while True:
+            self._last_beat = _time.monotonic()
+            eventlet.sleep(self.threshold / 4)
+
+    def _watch(self):
+        while True:
+            _time.sleep(self.interval)
+            frame = sys._current_frames().get(self._hub_ident)
+            if frame is None:
+                continue
+            stack = self._walk(frame)
+            with self._lock:
+                if len(self.samples) < MAX_UNIQUE_STACKS or stack in self.samples:
+                    self.samples[stack] += 1
+                else:
+                    self.samples['[truncated]'] += 1
+            self._check_blocking(frame)
+
+    def _check_blocking(self, frame):
+        stalled = _time.monotonic() - self._last_beat
+        if stalled < self.threshold:
+            self._current_block = None
+            return
+        if self._current_block is None:
+            self._current_block = {
+                'detected_at': datetime.utcnow().isoformat(),
+                'blocked_ms': 0,
+                'stack': ''.join(traceback.format_stack(frame)),
+            }
+            with self._lock:
+                self.blocking_events.append(self._current_block)
+            print(f"⚠️ Eventlet hub blocked for over {self.threshold * 1000:.0f}ms:\n{self._current_block['stack']}")
+        self._current_block['blocked_ms'] = round(stalled * 1000)
+
+    @staticmethod
+    def _walk(frame):
+        frames = []
+        while frame is not None:
+            code = frame.f_code
+            frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        return ';'.join(reversed(frames))
+
+    def blocking_report(self):
+        with self._lock:
+            events = list(self.blocking_events)
+        return {
+            'threshold_ms': round(self.threshold * 1000),
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'events': events,
+        }
+
+    def folded_stacks(self, reset=False):
+        with self._lock:
+            lines = [f"{stack} {count}" for stack, count in self.samples.most_common()]
+            if reset:
+                self.samples.clear()
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,453 @@
+import eventlet
+eventlet.monkey_patch()
+
+import json
+import os
+import secrets
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from urllib.parse import urlsplit
+
+import socketio
+
+from proxy import rewrite, route
+
+HEADER_LIMIT = 64 * 1024
+# Bus lines queued for one worker before it counts as stalled and is cut off
+BUS_QUEUE_LIMIT = 10000
+HEALTH_FAILURES = 3
+BOOT_GRACE = 10
+MAX_RESTART_DELAY = 30
+DRAIN_GRACE = 0.5
+# Closing a socket under a greenlet blocked on it raises EOFError in that
+# greenlet; left uncaught it propagates into the hub and stops the launcher
+CLOSED_ERRORS = (OSError, EOFError)
+
+
+class LauncherManager(socketio.PubSubManager):
+    """Socket.IO client manager that relays emits between workers.
+
+    Every emit is published as a JSON line to the launcher's bus, which sends
+    it back to all workers, so a message reaches the recipient's sockets
+    whichever worker they are connected to. Messages from other workers are
+    also appended to the local recent message cache. A worker that falls too
+    far behind on the bus is disconnected from it, and exits to be restarted.
+    """
+
+    name = 'launcher'
+
+    def __init__(self, bus_path, message_cache):
+        super().__init__(channel='chatapp')
+        self.message_cache = message_cache
+        self.bus = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.bus.connect(bus_path)
+        self._lock = threading.Lock()
+
+    def _publish(self, data):
+        line = (json.dumps(data) + '\n').encode()
+        with self._lock:
+            self.bus.sendall(line)
+
+    def _listen(self):
+        for line in self.bus.makefile('rb'):
+            yield json.loads(line)
+        # The launcher is gone; exit rather than run without cross-worker delivery
+        os._exit(1)
+
+    def _handle_emit(self, message):
+        super()._handle_emit(message)
+        if message.get('host_id') != self.host_id and message.get('event') == 'receive_message':
+            data = message['data']
+            self.message_cache.append(data['sender_id'], data['receiver_id'], data)
+
+
+class Worker:
+    def __init__(self, index, port):
+        self.index = index
+        self.port = port
+        self.process = None
+        self.started_at = None
+        self.restart_at = 0
+        self.restarts = 0
+        self.connections = 0
+        self.healthy = False
+        self.failures = 0
+        self.latency_ms = None
+        self.last_error = None
+        # The worker's own connection report, from its last health check
+        self.sockets = None
+
+    def start(self, bus_path, env):
+        self.process = subprocess.Popen([
+            sys.executable, os.path.abspath(__file__), 'worker', str(self.index), str(self.port), bus_path
+        ], env=env)
+        self.started_at = time.time()
+        self.sockets = None
+        self.healthy = False
+        self.failures = 0
+
+    def alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def status(self):
+        return {
+            'index': self.index,
+            'port': self.port,
+            'pid': self.process.pid if self.process else None,
+            'alive': self.alive(),
+            'healthy': self.healthy,
+            'uptime': round(time.time() - self.started_at) if self.started_at else None,
+            'restarts': self.restarts,
+            'connections': self.connections,
+            'latency_ms': self.latency_ms,
+            'last_error': self.last_error,
+            'sockets': self.sockets,
+        }
+
+
+class Launcher:
+    """Supervises eventlet workers behind a sticky proxy on a single host.
+
+    Engine.IO session ids are prefixed with the worker index, so the proxy
+    routes every polling request and websocket upgrade of a session to the
+    worker that created it. Other requests go to the least busy worker, or
+    to worker N with ``?worker=N`` (see proxy.route).
+    """
+
+    def __init__(self, port=8000, workers=1, base_port=None, drain_timeout=30, health_interval=5):
+        base_port = base_port or port + 1
+        self.port = port
+        self.workers = [Worker(i, base_port + i) for i in range(workers)]
+        self.drain_timeout = drain_timeout
+        self.health_interval = health_interval
+        self.stopping = False
+        self.listener = None
+        self.bus_path = None
+        self.worker_env = None
+        self.token = None
+        # Each worker's bus connection and its queue of lines to send
+        self.bus_clients = {}
+
+    @classmethod
+    def from_env(cls):
+        port = int(os.environ.get('PORT', 8000))
+        return cls(
+            port=port,
+            workers=int(os.environ.get('WORKERS', os.cpu_count() or 1)),
+            base_port=int(os.environ.get('WORKER_BASE_PORT', port + 1)),
+            drain_timeout=int(os.environ.get('DRAIN_TIMEOUT', 30)),
+            health_interval=int(os.environ.get('HEALTH_INTERVAL', 5))
+        )
+
+    def run(self):
+        from app import init_db
+
+        # Migrate once here rather than racing N workers on a fresh database
+        init_db()
+        self.token = secrets.token_hex(16)
+        self.worker_env = dict(
+            os.environ,
+            SCHEMA_READY='1',
+            DRAIN_TIMEOUT=str(self.drain_timeout),
+            LAUNCHER_TOKEN=self.token
+        )
+
+        self.bus_path = os.path.join(tempfile.mkdtemp(prefix='chatapp-'), 'bus.sock')
+        bus = eventlet.listen(self.bus_path, family=socket.AF_UNIX)
+        eventlet.spawn_n(self._serve_bus, bus)
+
+        for worker in self.workers:
+            worker.start(self.bus_path, self.worker_env)
+
+        self.listener = eventlet.listen(('0.0.0.0', self.port))
+        signal.signal(signal.SIGTERM, self._request_shutdown)
+        signal.signal(signal.SIGINT, self._request_shutdown)
+        eventlet.spawn_n(self._supervise)
+        eventlet.spawn_n(self._accept)
+
+        print(f"\n🚀 Starting ChatApp Clone with {len(self.workers)} workers on http://0.0.0.0:{self.port}")
+        # The signal handler only sets a flag: work it spawns may not run until
+        # the hub's next timer, since epoll_wait is retried after the signal,
+        # and closing the listener does not wake a greenlet blocked in accept()
+        while not self.stopping:
+            eventlet.sleep(0.2)
+        self.listener.close()
+        self._drain()
+
+    def _accept(self):
+        pool = eventlet.GreenPool()
+        while not self.stopping:
+            try:
+                client, address = self.listener.accept()
+            except OSError:
+                if self.stopping:
+                    return
+                raise
+            if self.stopping:
+                client.close()
+                return
+            pool.spawn_n(self._proxy, client, address)
+
+    # Shutdown
+    def _request_shutdown(self, signum, frame):
+        self.stopping = True
+
+    def _drain(self):
+        # On SIGTERM workers stop taking new sessions, tell their Socket.IO
+        # clients to disconnect, and exit once those connections are gone
+        print(f"Draining connections (up to {self.drain_timeout}s)...")
+        for worker in self.workers:
+            if worker.alive():
+                worker.process.terminate()
+
+        deadline = time.time() + self.drain_timeout
+        while time.time() < deadline and any(w.connections or w.alive() for w in self.workers):
+            eventlet.sleep(0.5)
+
+        for worker in self.workers:
+            if worker.alive():
+                print(f"⚠️ Worker {worker.index} did not drain in time, killing it")
+                worker.process.kill()
+                worker.process.wait()
+        os.unlink(self.bus_path)
+        print("✅ Shut down")
+
+    # Supervision
+    def _supervise(self):
+        while not self.stopping:
+            now = time.time()
+            for worker in self.workers:
+                if worker.alive():
+                    self._check(worker)
+                    continue
+                if worker.restart_at == 0:
+                    # Back off when a worker keeps crashing right after start
+                    quick_crash = now - worker.started_at < BOOT_GRACE
+                    delay = min(MAX_RESTART_DELAY, 2 ** worker.restarts) if quick_crash else 0
+                    worker.restart_at = now + delay
+                    worker.healthy = False
+                    worker.last_error = f'exited with code {worker.process.returncode}'
+                    print(f"⚠️ Worker {worker.index} {worker.last_error}, restarting in {delay}s")
+                if now >= worker.restart_at:
+                    worker.restart_at = 0
+                    worker.restarts += 1
+                    worker.start(self.bus_path, self.worker_env)
+            eventlet.sleep(self.health_interval)
+
+    def _check(self, worker):
+        started = time.monotonic()
+        try:
+            health_request = urllib.request.Request(
+                f'http://127.0.0.1:{worker.port}/healthz',
+                headers={'X-Launcher-Token': self.token}
+            )
+            with urllib.request.urlopen(health_request, timeout=2) as response:
+                health = json.load(response)
+        except (OSError, ValueError) as e:
+            if time.time() - worker.started_at < BOOT_GRACE:
+                return
+            worker.healthy = False
+            worker.failures += 1
+            worker.last_error = str(e)
+            if worker.failures >= HEALTH_FAILURES:
+                print(f"⚠️ Worker {worker.index} failed {worker.failures} health checks, killing it")
+                worker.process.kill()
+            return
+        worker.healthy = True
+        worker.failures = 0
+        worker.latency_ms = round((time.monotonic() - started) * 1000, 1)
+        worker.sockets = health.get('sockets')
+
+    def status(self):
+        # Socket counts and MAX_SOCKETS_PER_USER are per worker, so a user can
+        # hold up to the cap on each worker; the totals add the workers up
+        reports = [w.sockets for w in self.workers if w.alive() and w.sockets]
+        return {
+            'port': self.port,
+            'stopping': self.stopping,
+            'sockets': {
+                'connections': sum(r['connections'] for r in reports),
+                'estimated_memory_bytes': sum(r['estimated_memory_bytes'] for r in reports),
+                'queued_bytes': sum(r['queued_bytes'] for r in reports),
+                'workers_reporting': len(reports),
+            },
+            'workers': [worker.status() for worker in self.workers],
+        }
+
+    # Sticky proxy
+    @staticmethod
+    def _read_head(client):
+        data = b''
+        while b'\r\n\r\n' not in data:
+            chunk = client.recv(8192)
+            if not chunk or len(data) > HEADER_LIMIT:
+                return None
+            data += chunk
+        return data
+
+    @staticmethod
+    def _pipe(source, destination):
+        try:
+            while True:
+                data = source.recv(65536)
+                if not data:
+                    break
+                destination.sendall(data)
+            destination.shutdown(socket.SHUT_WR)
+        except CLOSED_ERRORS:
+            pass
+
+    def _respond(self, client, status, body):
+        body = json.dumps(body).encode()
+        client.sendall(
+            f'HTTP/1.1 {status}\r\nContent-Type: application/json\r\n'
+            f'Content-Length: {len(body)}\r\nConnection: close\r\n\r\n'.encode() + body
+        )
+
+    def _proxy(self, client, address):
+        try:
+            data = self._read_head(client)
+            if data is None:
+                return
+            request_line = data.split(b'\r\n', 1)[0].decode('latin-1').split(' ')
+            path = request_line[1] if len(request_line) > 1 else '/'
+
+            if urlsplit(path).path == '/launcher/health':
+                if address[0] not in ('127.0.0.1', '::1'):
+                    return self._respond(client, '403 Forbidden', {'error': 'Forbidden'})
+                return self._respond(client, '200 OK', self.status())
+
+            worker = route(self.workers, path)
+            if worker is None:
+                return self._respond(client, '503 Service Unavailable', {'error': 'No workers available'})
+
+            worker.connections += 1
+            try:
+                upstream = eventlet.connect(('127.0.0.1', worker.port))
+                try:
+                    upstream.sendall(rewrite(data))
+                    eventlet.spawn_n(self._pipe, client, upstream)
+                    self._pipe(upstream, client)
+                finally:
+                    upstream.close()
+            finally:
+                worker.connections -= 1
+        except CLOSED_ERRORS:
+            pass
+        finally:
+            client.close()
+
+    # Socket.IO bus between workers
+    def _serve_bus(self, listener):
+        while True:
+            conn, _ = listener.accept()
+            queue = eventlet.Queue(BUS_QUEUE_LIMIT)
+            self.bus_clients[conn] = queue
+            eventlet.spawn_n(self._read_bus, conn)
+            eventlet.spawn_n(self._write_bus, conn, queue)
+
+    def _read_bus(self, conn):
+        try:
+            for line in conn.makefile('rb'):
+                self._fan_out(line)
+        except CLOSED_ERRORS:
+            pass
+        finally:
+            self._drop_bus_client(conn)
+
+    def _fan_out(self, line):
+        # Never blocks: each worker has its own sender, so a stalled worker
+        # cannot hold up delivery to the others
+        for conn, queue in list(self.bus_clients.items()):
+            try:
+                queue.put_nowait(line)
+            except eventlet.queue.Full:
+                print(f"⚠️ A worker fell {BUS_QUEUE_LIMIT} messages behind on the bus, disconnecting it")
+                self._drop_bus_client(conn)
+
+    def _write_bus(self, conn, queue):
+        try:
+            while True:
+                line = queue.get()
+                if line is None:
+                    break
+                conn.sendall(line)
+        except CLOSED_ERRORS:
+            pass
+        finally:
+            self._drop_bus_client(conn)
+
+    def _drop_bus_client(self, conn):
+        queue = self.bus_clients.pop(conn, None)
+        if queue is None:
+            return
+        try:
+            # Wakes the sender if it is waiting for lines
+            queue.put_nowait(None)
+        except eventlet.queue.Full:
+            pass
+        try:
+            conn.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        conn.close()
+
+
+def drain_worker(socketio, connection_tracker, close_socket, timeout):
+    # Stop taking new sessions, close the open ones cleanly, then exit
+    connection_tracker.draining = True
+    for sid in list(connection_tracker.connections):
+        close_socket(sid, 'shutdown')
+
+    # Exit once every client has taken its queued packets (session_closed and
+    # the disconnect). Long-polling clients keep their Engine.IO session open
+    # after that, so waiting for the sessions to end would wait for timeout.
+    sockets = socketio.server.eio.sockets
+    deadline = time.time() + timeout
+    while time.time() < deadline and any(not s.queue.empty() for s in list(sockets.values())):
+        eventlet.sleep(0.2)
+    # Packets leave the queue just before they are written out
+    eventlet.sleep(DRAIN_GRACE)
+    os._exit(0)
+
+
+def run_worker(index, port, bus_path):
+    from app import app, socketio, message_cache, connection_tracker, close_socket
+
+    # Relay emits through the launcher and tag session ids with this worker
+    server = socketio.server
+    manager = LauncherManager(bus_path, message_cache)
+    manager.set_server(server)
+    server.manager = manager
+    server.manager_initialized = True
+    manager.initialize()
+
+    generate_id = server.eio.generate_id
+    server.eio.generate_id = lambda: f'{index}.{generate_id()}'
+
+    # The launcher ran the migrations and sets SCHEMA_READY, so init_db() is a no-op here
+    timeout = int(os.environ.get('DRAIN_TIMEOUT', 30))
+    stopping = []
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopping.append(signum))
+
+    def wait_for_shutdown():
+        # Polled for the same reason as in Launcher.run()
+        while not stopping:
+            eventlet.sleep(0.2)
+        drain_worker(socketio, connection_tracker, close_socket, timeout)
+
+    eventlet.spawn_n(wait_for_shutdown)
+    socketio.run(app, host='127.0.0.1', port=port, log_output=False)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) == 5 and sys.argv[1] == 'worker':
+        run_worker(int(sys.argv[2]), int(sys.argv[3]), sys.argv[4])
+    else:
+        Launcher.from_env().run()
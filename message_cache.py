@@ -0,0 +1,153 @@
+import threading
+from collections import OrderedDict, deque
+
+# Rough per-message overhead of the dict, keys and small values, in bytes
+MESSAGE_OVERHEAD = 400
+
+# Conversations whose last write sequence is remembered for fill()
+MAX_WRITE_KEYS = 10000
+
+
+def conversation_key(user_a, user_b):
+    return (min(user_a, user_b), max(user_a, user_b))
+
+
+def message_size(message):
+    return MESSAGE_OVERHEAD + len(message['content'])
+
+
+class Conversation:
+    def __init__(self, capacity):
+        self.messages = deque(maxlen=capacity)
+        # True when the buffer holds the whole conversation, not just its tail
+        self.complete = False
+        self.size = 0
+
+    def append(self, message):
+        if len(self.messages) == self.messages.maxlen:
+            self.complete = False
+            if message['id'] < self.messages[0]['id']:
+                # Older than the whole buffer, which still holds the latest ones
+                return
+            self.size -= message_size(self.messages.popleft())
+        # Messages relayed from other workers can arrive after newer local
+        # ones, so insert by id rather than arrival order
+        index = len(self.messages)
+        while index and self.messages[index - 1]['id'] > message['id']:
+            index -= 1
+        self.messages.insert(index, message)
+        self.size += message_size(message)
+
+
+class MessageCache:
+    """Bounded LRU of per-conversation ring buffers of serialized messages.
+
+    Each buffer holds the latest ``per_conversation`` messages. A read is a
+    hit when the buffer is known to hold the whole conversation or at least
+    the requested number of latest messages. Writes append to the buffer, so
+    the cache must see every message sent in the conversation.
+    """
+
+    def __init__(self, max_conversations=1000, per_conversation=50, max_bytes=32 * 1024 * 1024):
+        self.max_conversations = max_conversations
+        self.per_conversation = per_conversation
+        self.max_bytes = max_bytes
+        self.enabled = max_conversations > 0 and per_conversation > 0
+        self._conversations = OrderedDict()
+        self._size = 0
+        self._write_seq = 0
+        # Sequence of the latest append per conversation, oldest first; fills
+        # of forgotten conversations compare against the newest forgotten one
+        self._last_writes = OrderedDict()
+        self._forgotten_seq = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, user_a, user_b, limit=None):
+        if not self.enabled:
+            return None
+        key = conversation_key(user_a, user_b)
+        with self._lock:
+            entry = self._conversations.get(key)
+            if entry is not None and (entry.complete or (limit is not None and limit <= len(entry.messages))):
+                self._conversations.move_to_end(key)
+                self.hits += 1
+                messages = list(entry.messages)
+                return messages[-limit:] if limit else messages
+            self.misses += 1
+            return None
+
+    def write_seq(self):
+        # Taken before a database read and passed to fill(), so a fill that
+        # raced with a new message in its conversation never replaces the
+        # fresher buffer; writes to other conversations do not affect it
+        return self._write_seq
+
+    def fill(self, user_a, user_b, messages, complete, seq):
+        if not self.enabled:
+            return
+        key = conversation_key(user_a, user_b)
+        with self._lock:
+            if self._last_writes.get(key, self._forgotten_seq) > seq:
+                return
+            entry = Conversation(self.per_conversation)
+            for message in messages[-self.per_conversation:]:
+                entry.append(message)
+            entry.complete = complete and len(messages) <= self.per_conversation
+            self._replace(key, entry)
+
+    def append(self, user_a, user_b, message):
+        if not self.enabled:
+            return
+        key = conversation_key(user_a, user_b)
+        with self._lock:
+            self._write_seq += 1
+            self._last_writes[key] = self._write_seq
+            self._last_writes.move_to_end(key)
+            if len(self._last_writes) > MAX_WRITE_KEYS:
+                _, self._forgotten_seq = self._last_writes.popitem(last=False)
+            entry = self._conversations.get(key)
+            if entry is not None and any(m['id'] == message['id'] for m in entry.messages):
+                # Already seen, e.g. relayed from another worker for both rooms
+                return
+            if entry is None:
+                # Only the tail is known; still serves the newest messages
+                entry = Conversation(self.per_conversation)
+                self._conversations[key] = entry
+            self._size -= entry.size
+            entry.append(message)
+            self._size += entry.size
+            self._conversations.move_to_end(key)
+            self._evict()
+
+    def _replace(self, key, entry):
+        old = self._conversations.pop(key, None)
+        if old is not None:
+            self._size -= old.size
+        self._conversations[key] = entry
+        self._size += entry.size
+        self._evict()
+
+    def _evict(self):
+        while self._conversations and (len(self._conversations) > self.max_conversations or self._size > self.max_bytes):
+            _, entry = self._conversations.popitem(last=False)
+            self._size -= entry.size
+            self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'conversations': len(self._conversations),
+                'max_conversations': self.max_conversations,
+                'per_conversation': self.per_conversation,
+                'estimated_bytes': self._size,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0,
+                'evictions': self.evictions,
+            }
@@ -0,0 +1,92 @@
+from sqlalchemy import exc, inspect, text
+
+# Registered migrations per target as (version, description, function):
+# 'app' is the main database, 'shard' each message shard, which only has the
+# message table. Each function gets a connection inside an open transaction
+# and must be safe to re-run, since a database created by create_all() may
+# already have the change.
+MIGRATIONS = {'app': [], 'shard': []}
+
+
+def migration(version, description, targets=('app',)):
+    def decorator(func):
+        for target in targets:
+            MIGRATIONS[target].append((version, description, func))
+            MIGRATIONS[target].sort(key=lambda m: m[0])
+        return func
+    return decorator
+
+
+def latest_version(target='app'):
+    migrations = MIGRATIONS[target]
+    return migrations[-1][0] if migrations else 0
+
+
+def current_version(conn):
+    try:
+        return conn.execute(text('SELECT version FROM schema_version')).scalar() or 0
+    except exc.DBAPIError:
+        # No schema_version table yet: a fresh or pre-migration database
+        conn.rollback()
+        return 0
+
+
+# Helpers for online schema changes
+def add_column(conn, table, column, ddl):
+    columns = {c['name'] for c in inspect(conn).get_columns(table)}
+    if column not in columns:
+        conn.execute(text(f'ALTER TABLE {table} ADD COLUMN {column} {ddl}'))
+
+
+def create_index(conn, name, table, columns):
+    conn.execute(text(f'CREATE INDEX IF NOT EXISTS {name} ON {table} ({", ".join(columns)})'))
+
+
+# Migrations
+@migration(1, 'baseline tables', targets=('app', 'shard'))
+def create_tables(conn, metadata):
+    metadata.create_all(bind=conn)
+
+
+@migration(2, 'message conversation and unread indexes', targets=('app', 'shard'))
+def message_indexes(conn, metadata):
+    create_index(conn, 'ix_message_conversation', 'message', ['sender_id', 'receiver_id', 'timestamp'])
+    create_index(conn, 'ix_message_unread', 'message', ['receiver_id', 'sender_id', 'read'])
+
+
+def upgrade(engine, metadata, target='app'):
+    # Fast path: a single query when the schema is already current
+    with engine.connect() as conn:
+        version = current_version(conn)
+    if version >= latest_version(target):
+        return version
+
+    with engine.begin() as conn:
+        conn.execute(text('CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)'))
+        # A single statement, so concurrent starts cannot both insert the row
+        conn.execute(text(
+            'INSERT INTO schema_version (version) '
+            'SELECT 0 WHERE NOT EXISTS (SELECT 1 FROM schema_version)'
+        ))
+
+    for version, description, func in MIGRATIONS[target]:
+        with engine.begin() as conn:
+            # Take the write lock first (pysqlite only opens a transaction on
+            # DML), so the re-check and the migration are serialized between
+            # processes and a concurrent run waits, then sees the new version
+            conn.execute(text('UPDATE schema_version SET version = version'))
+            if current_version(conn) >= version:
+                continue
+            func(conn, metadata)
+            conn.execute(text('UPDATE schema_version SET version = :v'), {'v': version})
+            print(f"✅ Applied migration {version}: {description}")
+
+    return latest_version(target)
+
+
+if __name__ == '__main__':
+    from app import app, db
+
+    with app.app_context():
+        version = upgrade(db.engine, db.metadata)
+    print(f"✅ Database schema at version {version}")
@@ -0,0 +1,57 @@
+from datetime import datetime
+
+from flask_login import UserMixin
+from flask_sqlalchemy import SQLAlchemy
+from werkzeug.security import generate_password_hash, check_password_hash
+
+# Models and helpers shared by app.py (eventlet) and asgi_app.py (asyncio).
+# app.py binds db to its Flask app; asgi_app.py only uses the mapped classes.
+db = SQLAlchemy()
+
+
+class User(UserMixin, db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    username = db.Column(db.String(80), unique=True, nullable=False)
+    password_hash = db.Column(db.String(200), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def set_password(self, password):
+        self.password_hash = generate_password_hash(password)
+    
+    def check_password(self, password):
+        return check_password_hash(self.password_hash, password)
+
+
+class Message(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    sender_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    receiver_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    content = db.Column(db.Text, nullable=False)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    read = db.Column(db.Boolean, default=False)
+    
+    sender = db.relationship('User', foreign_keys=[sender_id], backref='sent_messages')
+    receiver = db.relationship('User', foreign_keys=[receiver_id], backref='received_messages')
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'sender_id': self.sender_id,
+            'receiver_id': self.receiver_id,
+            'content': self.content,
+            'time': self.timestamp.strftime('%I:%M %p')
+        }
+    
+    # Keep in sync with migrations.py so new and upgraded databases match
+    __table_args__ = (
+        db.Index('ix_message_conversation', 'sender_id', 'receiver_id', 'timestamp'),
+        db.Index('ix_message_unread', 'receiver_id', 'sender_id', 'read'),
+    )
+
+
+def parse_user_id(value):
+    # Client-supplied ids are validated before they pick a shard
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,43 @@
+from urllib.parse import parse_qs, urlsplit
+
+# Request routing for the launcher's sticky proxy. Kept free of eventlet so it
+# can be imported, and tested, without monkey-patching the process.
+
+
+def _index(value, workers):
+    return int(value) if value.isdigit() and int(value) < len(workers) else None
+
+
+def route(workers, path):
+    """Picks the worker for a request path, or None if none can take it.
+
+    Engine.IO requests carry ``sid=<index>.<id>`` and go to the worker that
+    created the session. ``?worker=N`` sends any other request to worker N,
+    so per-worker reports such as ``/admin/cache`` can be read from each one.
+    Everything else goes to the least busy healthy worker.
+    """
+    query = parse_qs(urlsplit(path).query)
+    index = _index(query.get('sid', [''])[0].split('.', 1)[0], workers)
+    if index is not None and workers[index].alive():
+        return workers[index]
+
+    if 'worker' in query:
+        index = _index(query['worker'][0], workers)
+        return workers[index] if index is not None and workers[index].alive() else None
+
+    # New sessions and plain requests go to the least busy healthy worker
+    candidates = [w for w in workers if w.alive() and w.healthy] or \
+        [w for w in workers if w.alive()]
+    return min(candidates, key=lambda w: w.connections) if candidates else None
+
+
+def rewrite(data):
+    # One request per upstream connection, so keep-alive never carries
+    # requests of several sessions; websocket upgrades pass through as-is
+    head, _, rest = data.partition(b'\r\n\r\n')
+    lines = head.split(b'\r\n')
+    if any(line.lower().startswith(b'upgrade:') for line in lines[1:]):
+        return data
+    lines = [lines[0]] + [line for line in lines[1:] if not line.lower().startswith(b'connection:')]
+    lines.append(b'Connection: close')
+    return b'\r\n'.join(lines) + b'\r\n\r\n' + rest
@@ -0,0 +1,38 @@
+import sys
+
+from sqlalchemy import inspect
+
+from app import app, db, init_db, message_shards, Message
+from shards import MessageShards, rebalance
+
+# Moves existing messages into the layout configured by MESSAGE_SHARDS.
+# Stop the app first, then run:
+#   python rebalance_shards.py [OLD_SHARDS]
+# OLD_SHARDS is the previous shard count; omit it (or pass 0) when the
+# messages are still in chat.db. Each batch moves in one transaction, so an
+# interrupted run can be re-run safely.
+
+
+def route(sender_id, receiver_id):
+    return message_shards.shard_for(sender_id, receiver_id) if message_shards else 0
+
+
+if __name__ == '__main__':
+    old_count = int(sys.argv[1]) if len(sys.argv) > 1 else 0
+
+    # Creates the target shards with the current schema
+    init_db()
+
+    with app.app_context():
+        old_shards = MessageShards.from_config(
+            dict(app.config, MESSAGE_SHARDS=old_count), app.instance_path, Message
+        )
+        sources = old_shards.engines if old_shards else [db.engine]
+        targets = message_shards.engines if message_shards else [db.engine]
+
+        for source in sources:
+            if not inspect(source).has_table('message'):
+                print(f"⚠️ Skipping {source.url}: no message table")
+                continue
+            moved, kept = rebalance(source, targets, route)
+            print(f"✅ {source.url}: moved {moved} messages, kept {kept}")
@@ -1,12 +1,16 @@
+import glob
 import os
-from app import app, db
+from app import app, init_db
+from shards import database_url, shard_url
 
-# Delete old database
-if os.path.exists('chat.db'):
-    os.remove('chat.db')
-    print("✅ Old database deleted")
+# Delete old database and every message shard, whatever the shard count was
+paths = [database_url(app.config['SQLALCHEMY_DATABASE_URI'], app.instance_path).database]
+paths += sorted(glob.glob(shard_url(app.config['MESSAGE_SHARD_URL'], '*', app.instance_path).database))
+for path in paths:
+    if path and os.path.exists(path):
+        os.remove(path)
+        print(f"✅ Deleted {os.path.basename(path)}")
 
 # Create new database
-with app.app_context():
-    db.create_all()
-    print("✅ New database created successfully!")
\ No newline at end of file
+init_db()
+print("✅ New database created successfully!")
@@ -1,7 +1,9 @@
-from waitress import serve
-from app import app, socketio
+import eventlet
+eventlet.monkey_patch()
+
+from launcher import Launcher
 
 if __name__ == '__main__':
-    # Production server for Windows
-    print("Starting production server on http://0.0.0.0:5000")
-    serve(socketio, host='0.0.0.0', port=5000, threads=4)
\ No newline at end of file
+    # Production server for Linux: WORKERS eventlet processes behind a sticky
+    # proxy on PORT, restarted on crash and drained on SIGTERM
+    Launcher.from_env().run()
\ No newline at end of file
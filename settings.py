@@ -0,0 +1,26 @@
+import os
+
+
+def from_env():
+    """Settings shared by app.py and asgi_app.py, read from the environment."""
+    return {
+        'SECRET_KEY': os.environ.get('SECRET_KEY', 'your-secret-key-change-in-production'),
+        'SQLALCHEMY_DATABASE_URI': os.environ.get('DATABASE_URL', 'sqlite:///chat.db'),
+        'SQLALCHEMY_TRACK_MODIFICATIONS': False,
+        # Admins are keyed by user id; usernames can be claimed by anyone through /register
+        'ADMIN_USER_IDS': [int(u) for u in os.environ.get('ADMIN_USER_IDS', '').split(',') if u.strip()],
+        'DIAGNOSTICS': os.environ.get('DIAGNOSTICS', '0') == '1',
+        'BLOCKING_THRESHOLD_MS': int(os.environ.get('BLOCKING_THRESHOLD_MS', 100)),
+        'PROFILE_INTERVAL_MS': int(os.environ.get('PROFILE_INTERVAL_MS', 10)),
+        'MESSAGE_CACHE_CONVERSATIONS': int(os.environ.get('MESSAGE_CACHE_CONVERSATIONS', 1000)),
+        'MESSAGE_CACHE_SIZE': int(os.environ.get('MESSAGE_CACHE_SIZE', 50)),
+        'MESSAGE_CACHE_MAX_MB': int(os.environ.get('MESSAGE_CACHE_MAX_MB', 32)),
+        'MESSAGE_SHARDS': int(os.environ.get('MESSAGE_SHARDS', 0)),
+        'MESSAGE_SHARD_URL': os.environ.get('MESSAGE_SHARD_URL', 'sqlite:///chat_shard_{}.db'),
+        'SOCKET_PING_INTERVAL': int(os.environ.get('SOCKET_PING_INTERVAL', 25)),
+        'SOCKET_PING_TIMEOUT': int(os.environ.get('SOCKET_PING_TIMEOUT', 20)),
+        'SOCKET_IDLE_TIMEOUT': int(os.environ.get('SOCKET_IDLE_TIMEOUT', 0)),
+        'MAX_SOCKETS_PER_USER': int(os.environ.get('MAX_SOCKETS_PER_USER', 10)),
+        # Set by launcher.py so only it can collect worker reports through /healthz
+        'LAUNCHER_TOKEN': os.environ.get('LAUNCHER_TOKEN', ''),
+    }
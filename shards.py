@@ -0,0 +1,145 @@
+import os
+import zlib
+from collections import defaultdict
+
+from sqlalchemy import Column, Index, MetaData, Table, create_engine, func, inspect, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import sessionmaker
+
+import migrations
+
+
+def database_url(url, instance_path):
+    # Relative SQLite paths live in the instance folder, as with Flask-SQLAlchemy
+    url = make_url(url)
+    if url.drivername.startswith('sqlite') and url.database and not os.path.isabs(url.database):
+        os.makedirs(instance_path, exist_ok=True)
+        url = url.set(database=os.path.join(instance_path, url.database))
+    return url
+
+
+def shard_url(template, index, instance_path):
+    return database_url(template.format(index), instance_path)
+
+
+def shard_metadata(message_table):
+    # Shards hold only the message table and its indexes. Users stay in the
+    # app database, so the copy drops the foreign keys to them, which would
+    # otherwise reject every insert on a shard with PRAGMA foreign_keys=ON.
+    metadata = MetaData()
+    table = Table(message_table.name, metadata, *[
+        Column(c.name, c.type, primary_key=c.primary_key, nullable=c.nullable)
+        for c in message_table.columns
+    ])
+    for index in message_table.indexes:
+        Index(index.name, *[table.c[c.name] for c in index.columns])
+    return metadata
+
+
+class MessageShards:
+    """Routes each conversation's messages to one of several databases.
+
+    The shard is picked from a stable hash of the canonical user pair, so all
+    messages between two users live in one file and their reads, unread counts
+    and read marks stay local to it. Each shard has its own engine and pool.
+    """
+
+    def __init__(self, urls, message_model):
+        self.urls = urls
+        self.engines = [create_engine(url) for url in urls]
+        self.sessions = [sessionmaker(bind=engine, expire_on_commit=False) for engine in self.engines]
+        self.Message = message_model
+        self.metadata = shard_metadata(message_model.__table__)
+
+    @classmethod
+    def from_config(cls, config, instance_path, message_model):
+        count = config['MESSAGE_SHARDS']
+        if count <= 1:
+            return None
+        template = config['MESSAGE_SHARD_URL']
+        return cls([shard_url(template, i, instance_path) for i in range(count)], message_model)
+
+    def __len__(self):
+        return len(self.engines)
+
+    def shard_for(self, user_a, user_b):
+        user_a, user_b = int(user_a), int(user_b)
+        key = f'{min(user_a, user_b)}:{max(user_a, user_b)}'.encode()
+        return zlib.crc32(key) % len(self.engines)
+
+    def session(self, user_a, user_b):
+        return self.sessions[self.shard_for(user_a, user_b)]()
+
+    def upgrade(self):
+        for engine in self.engines:
+            migrations.upgrade(engine, self.metadata, 'shard')
+
+    def unread_counts(self, receiver_id):
+        Message = self.Message
+        counts = {}
+        for Session in self.sessions:
+            with Session() as s:
+                rows = s.query(Message.sender_id, func.count()).filter(
+                    Message.receiver_id == receiver_id,
+                    Message.read == False
+                ).group_by(Message.sender_id)
+                counts.update(rows.all())
+        return counts
+
+
+def move_messages(source, target, ids, columns):
+    # Copy and delete in one transaction on the source connection, with the
+    # target file attached, so a batch is either fully moved or not at all
+    id_list = ','.join(str(int(i)) for i in ids)
+    with source.connect() as conn:
+        conn.exec_driver_sql('ATTACH DATABASE ? AS target', (target.url.database,))
+        conn.commit()
+        try:
+            with conn.begin():
+                conn.execute(text(
+                    f'INSERT INTO target.message ({columns}) '
+                    f'SELECT {columns} FROM main.message WHERE id IN ({id_list})'
+                ))
+                conn.execute(text(f'DELETE FROM main.message WHERE id IN ({id_list})'))
+        finally:
+            conn.exec_driver_sql('DETACH DATABASE target')
+            conn.commit()
+    return len(ids)
+
+
+def rebalance(source, targets, route, batch_size=500):
+    """Moves the messages in ``source`` to ``targets[route(sender_id, receiver_id)]``.
+
+    Messages already in their target are kept. Both sides must be SQLite files.
+    Each batch moves atomically, so an interrupted run can simply be re-run.
+    Returns ``(moved, kept)``.
+    """
+    engines = [source, *targets]
+    if any(e.url.get_backend_name() != 'sqlite' or not e.url.database for e in engines):
+        raise ValueError('rebalance only supports SQLite database files')
+
+    names = [c['name'] for c in inspect(source).get_columns('message') if c['name'] != 'id']
+    columns = ', '.join(f'"{name}"' for name in names)
+
+    moved = kept = 0
+    last_id = 0
+    while True:
+        with source.connect() as conn:
+            rows = conn.execute(
+                text('SELECT id, sender_id, receiver_id FROM message WHERE id > :last ORDER BY id LIMIT :limit'),
+                {'last': last_id, 'limit': batch_size}
+            ).all()
+        if not rows:
+            return moved, kept
+        last_id = rows[-1].id
+
+        batches = defaultdict(list)
+        for row in rows:
+            target = targets[route(row.sender_id, row.receiver_id)]
+            if target.url == source.url:
+                kept += 1
+            else:
+                batches[target].append(row.id)
+
+        for target, ids in batches.items():
+            moved += move_messages(source, target, ids, columns)
@@ -0,0 +1,713 @@
+# Pages shared by app.py and asgi_app.py
+LOGIN_TEMPLATE = '''
+<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>ChatApp - Login</title>
+    <style>
+        * { margin: 0; padding: 0; box-sizing: border-box; }
+        body {
+            font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
+            background: linear-gradient(135deg, #128C7E 0%, #25D366 100%);
+            height: 100vh;
+            display: flex;
+            align-items: center;
+            justify-content: center;
+        }
+        .login-container {
+            background: white;
+            padding: 40px;
+            border-radius: 15px;
+            box-shadow: 0 10px 40px rgba(0,0,0,0.2);
+            width: 400px;
+        }
+        h2 {
+            color: #128C7E;
+            margin-bottom: 30px;
+            text-align: center;
+            font-size: 28px;
+        }
+        .form-group {
+            margin-bottom: 20px;
+        }
+        label {
+            display: block;
+            margin-bottom: 8px;
+            color: #333;
+            font-weight: 500;
+        }
+        input {
+            width: 100%;
+            padding: 12px;
+            border: 1px solid #ddd;
+            border-radius: 8px;
+            font-size: 14px;
+            outline: none;
+            transition: border 0.3s;
+        }
+        input:focus {
+            border-color: #25D366;
+        }
+        button {
+            width: 100%;
+            padding: 12px;
+            background: #25D366;
+            color: white;
+            border: none;
+            border-radius: 8px;
+            font-size: 16px;
+            font-weight: 600;
+            cursor: pointer;
+            transition: background 0.3s;
+        }
+        button:hover {
+            background: #20ba5a;
+        }
+        .switch-form {
+            text-align: center;
+            margin-top: 20px;
+            color: #666;
+        }
+        .switch-form a {
+            color: #128C7E;
+            text-decoration: none;
+            font-weight: 600;
+        }
+        .error {
+            background: #fee;
+            color: #c33;
+            padding: 10px;
+            border-radius: 5px;
+            margin-bottom: 20px;
+        }
+    </style>
+</head>
+<body>
+    <div class="login-container">
+        <h2>{% if register %}Register{% else %}Login{% endif %} to ChatApp</h2>
+        {% if error %}
+        <div class="error">{{ error }}</div>
+        {% endif %}
+        <form method="POST">
+            <div class="form-group">
+                <label>Username</label>
+                <input type="text" name="username" required>
+            </div>
+            <div class="form-group">
+                <label>Password</label>
+                <input type="password" name="password" required>
+            </div>
+            <button type="submit">{% if register %}Register{% else %}Login{% endif %}</button>
+        </form>
+        <div class="switch-form">
+            {% if register %}
+            Already have an account? <a href="{{ url_for('login') }}">Login here</a>
+            {% else %}
+            Don't have an account? <a href="{{ url_for('register') }}">Register here</a>
+            {% endif %}
+        </div>
+    </div>
+</body>
+</html>
+'''
+
+CHAT_TEMPLATE = '''
+<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>ChatApp Web</title>
+    <script src="https://cdn.socket.io/4.5.4/socket.io.min.js"></script>
+    <style>
+        * { margin: 0; padding: 0; box-sizing: border-box; }
+        body {
+            font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
+            background: white;
+            height: 100vh;
+            overflow: hidden;
+        }
+        .container { display: flex; height: 100vh; }
+        
+        /* Sidebar */
+        .sidebar {
+            width: 380px;
+            border-right: 1px solid #e0e0e0;
+            display: flex;
+            flex-direction: column;
+            background: #f8f9fa;
+        }
+        .sidebar-header {
+            background: #ededed;
+            padding: 15px;
+            display: flex;
+            justify-content: space-between;
+            align-items: center;
+            border-bottom: 1px solid #d1d1d1;
+        }
+        .sidebar-header h2 {
+            color: #111;
+            font-size: 18px;
+        }
+        .user-info {
+            display: flex;
+            align-items: center;
+            gap: 10px;
+        }
+        .logout-btn {
+            background: #dc3545;
+            color: white;
+            border: none;
+            padding: 6px 12px;
+            border-radius: 5px;
+            cursor: pointer;
+            font-size: 12px;
+        }
+        .search-box {
+            padding: 10px;
+            background: white;
+            border-bottom: 1px solid #e0e0e0;
+        }
+        .search-box input {
+            width: 100%;
+            padding: 10px;
+            border: 1px solid #e0e0e0;
+            border-radius: 20px;
+            outline: none;
+        }
+        .online-users {
+            flex: 1;
+            overflow-y: auto;
+            background: white;
+        }
+        .user-item {
+            padding: 15px;
+            border-bottom: 1px solid #f0f0f0;
+            cursor: pointer;
+            display: flex;
+            align-items: center;
+            transition: background 0.2s;
+        }
+        .user-item:hover { background: #f5f5f5; }
+        .user-item.active { background: #ebebeb; }
+        .avatar {
+            width: 50px;
+            height: 50px;
+            border-radius: 50%;
+            background: linear-gradient(135deg, #25D366, #128C7E);
+            display: flex;
+            align-items: center;
+            justify-content: center;
+            color: white;
+            font-weight: bold;
+            font-size: 20px;
+            margin-right: 15px;
+        }
+        .user-info-text {
+            flex: 1;
+        }
+        .username {
+            font-weight: 600;
+            color: #111;
+            margin-bottom: 3px;
+        }
+        .status {
+            font-size: 12px;
+            color: #25D366;
+        }
+        .unread-badge {
+            background: #25D366;
+            color: white;
+            border-radius: 50%;
+            width: 20px;
+            height: 20px;
+            display: flex;
+            align-items: center;
+            justify-content: center;
+            font-size: 11px;
+            font-weight: bold;
+        }
+        
+        /* Chat Area */
+        .chat-area {
+            flex: 1;
+            display: flex;
+            flex-direction: column;
+        }
+        .welcome-screen {
+            flex: 1;
+            display: flex;
+            align-items: center;
+            justify-content: center;
+            flex-direction: column;
+            color: #667781;
+        }
+        .welcome-screen h2 {
+            font-size: 32px;
+            margin-bottom: 10px;
+            color: #111;
+        }
+        #chatContainer {
+            display: none;
+            flex: 1;
+            flex-direction: column;
+        }
+        .chat-header {
+            background: #ededed;
+            padding: 15px;
+            display: flex;
+            align-items: center;
+            justify-content: space-between;
+            border-bottom: 1px solid #d1d1d1;
+        }
+        .chat-header-left {
+            display: flex;
+            align-items: center;
+        }
+        .chat-header-info h3 {
+            color: #111;
+            font-size: 16px;
+        }
+        .typing-indicator {
+            font-size: 12px;
+            color: #667781;
+            font-style: italic;
+        }
+        .messages-area {
+            flex: 1;
+            overflow-y: auto;
+            padding: 20px;
+            background: #e5ddd5;
+            background-image: url("data:image/svg+xml,%3Csvg width='60' height='60' viewBox='0 0 60 60' xmlns='http://www.w3.org/2000/svg'%3E%3Cg fill='none' fill-rule='evenodd'%3E%3Cg fill='%23d4cdc6' fill-opacity='0.3'%3E%3Cpath d='M36 34v-4h-2v4h-4v2h4v4h2v-4h4v-2h-4zm0-30V0h-2v4h-4v2h4v4h2V6h4V4h-4zM6 34v-4H4v4H0v2h4v4h2v-4h4v-2H6zM6 4V0H4v4H0v2h4v4h2V6h4V4H6z'/%3E%3C/g%3E%3C/g%3E%3C/svg%3E");
+        }
+        .message {
+            margin-bottom: 15px;
+            display: flex;
+            animation: fadeIn 0.3s;
+        }
+        .load-older-btn {
+            display: block;
+            margin: 0 auto 15px;
+            background: white;
+            color: #128C7E;
+            border: none;
+            padding: 6px 14px;
+            border-radius: 15px;
+            box-shadow: 0 1px 2px rgba(0,0,0,0.1);
+            cursor: pointer;
+            font-size: 12px;
+        }
+        @keyframes fadeIn {
+            from { opacity: 0; transform: translateY(10px); }
+            to { opacity: 1; transform: translateY(0); }
+        }
+        .message.sent { justify-content: flex-end; }
+        .message-bubble {
+            max-width: 60%;
+            padding: 10px 15px;
+            border-radius: 8px;
+            box-shadow: 0 1px 2px rgba(0,0,0,0.1);
+        }
+        .message.received .message-bubble { background: white; }
+        .message.sent .message-bubble { background: #d9fdd3; }
+        .message-text {
+            color: #111;
+            font-size: 14px;
+            line-height: 1.5;
+            margin-bottom: 3px;
+            word-wrap: break-word;
+        }
+        .message-time {
+            font-size: 11px;
+            color: #667781;
+            text-align: right;
+        }
+        .input-area {
+            background: #f0f0f0;
+            padding: 15px;
+            display: flex;
+            align-items: center;
+            gap: 10px;
+        }
+        .input-area input {
+            flex: 1;
+            padding: 12px;
+            border: 1px solid #e0e0e0;
+            border-radius: 25px;
+            outline: none;
+            font-size: 14px;
+        }
+        .send-btn {
+            background: #25D366;
+            color: white;
+            border: none;
+            padding: 10px 20px;
+            border-radius: 25px;
+            cursor: pointer;
+            font-size: 14px;
+            font-weight: 500;
+        }
+        .send-btn:hover { background: #20ba5a; }
+        .connection-banner {
+            display: none;
+            background: #fff3cd;
+            color: #664d03;
+            padding: 10px 15px;
+            font-size: 13px;
+            border-bottom: 1px solid #ffe69c;
+        }
+        .connection-banner button {
+            margin-left: 10px;
+            background: #128C7E;
+            color: white;
+            border: none;
+            padding: 4px 10px;
+            border-radius: 5px;
+            cursor: pointer;
+            font-size: 12px;
+        }
+    </style>
+</head>
+<body>
+    <div class="container">
+        <div class="sidebar">
+            <div class="sidebar-header">
+                <h2>ChatsApp</h2>
+                <div class="user-info">
+                    <span style="color: #111; font-weight: 600;">{{ current_user.username }}</span>
+                    <button class="logout-btn" onclick="logout()">Logout</button>
+                </div>
+            </div>
+            
+            <div class="search-box">
+                <input type="text" placeholder="Search users..." id="searchInput" oninput="filterUsers()">
+            </div>
+            
+            <div class="online-users" id="usersList"></div>
+        </div>
+        
+        <div class="chat-area">
+            <div class="connection-banner" id="connectionBanner"></div>
+            
+            <div id="welcomeScreen" class="welcome-screen">
+                <h2>Welcome to ChatApp</h2>
+                <p>Select a user to start chatting</p>
+            </div>
+            
+            <div id="chatContainer">
+                <div class="chat-header">
+                    <div class="chat-header-left">
+                        <div class="avatar" id="chatHeaderAvatar"></div>
+                        <div class="chat-header-info">
+                            <h3 id="chatHeaderName"></h3>
+                            <div class="typing-indicator" id="typingIndicator" style="display:none;">typing...</div>
+                        </div>
+                    </div>
+                </div>
+                
+                <div class="messages-area" id="messagesArea"></div>
+                
+                <div class="input-area">
+                    <input type="text" placeholder="Type a message" id="messageInput" onkeypress="handleKeyPress(event)" oninput="handleTyping()">
+                    <button class="send-btn" onclick="sendMessage()">Send</button>
+                </div>
+            </div>
+        </div>
+    </div>
+    
+    <script>
+        const socket = io();
+        const currentUserId = {{ current_user.id }};
+        const currentUsername = "{{ current_user.username }}";
+        let selectedUserId = null;
+        let typingTimeout = null;
+        const messageLimit = {{ message_limit }};
+        let oldestMessageId = null;
+        
+        let closedReason = null;
+        
+        socket.on('connect', () => {
+            console.log('Connected to server');
+            closedReason = null;
+            hideBanner();
+            loadUsers();
+            if (selectedUserId) loadMessages(selectedUserId); // Catch up after a reconnect
+        });
+        
+        socket.on('session_closed', (data) => {
+            closedReason = data.reason;
+        });
+        
+        socket.on('disconnect', (reason) => {
+            // Only server-side disconnects need handling; socket.io retries the rest
+            if (reason !== 'io server disconnect') return;
+            if (closedReason === 'shutdown') {
+                // Server is restarting; spread the reconnects out
+                showBanner('Server restarting, reconnecting...');
+                setTimeout(() => socket.connect(), 2000 + Math.random() * 3000);
+            } else if (closedReason === 'idle') {
+                // Reconnects on the next activity, see reportActivity()
+                showBanner('Disconnected after inactivity. New messages will load when you come back.', true);
+            } else if (closedReason === 'evicted') {
+                // Not automatic: reconnecting would close another of this user's tabs
+                showBanner('ChatApp is open in too many tabs, so this one was disconnected.', true);
+            } else {
+                showBanner('Disconnected from server.', true);
+            }
+        });
+        
+        function showBanner(text, withReconnect) {
+            const banner = document.getElementById('connectionBanner');
+            banner.textContent = text;
+            if (withReconnect) {
+                const button = document.createElement('button');
+                button.textContent = 'Reconnect';
+                button.onclick = () => socket.connect();
+                banner.appendChild(button);
+            }
+            banner.style.display = 'block';
+        }
+        
+        function hideBanner() {
+            document.getElementById('connectionBanner').style.display = 'none';
+        }
+        
+        // Reading counts as activity too, so tell the server the user is
+        // still here, at most twice per idle timeout (once a minute if off)
+        const idleTimeout = {{ idle_timeout }};
+        const activityInterval = idleTimeout > 0 ? idleTimeout * 500 : 60000;
+        let lastActivity = 0;
+        function reportActivity() {
+            if (!socket.connected) {
+                if (closedReason === 'idle') socket.connect();
+                return;
+            }
+            const now = Date.now();
+            if (now - lastActivity > activityInterval) {
+                lastActivity = now;
+                socket.emit('active');
+            }
+        }
+        ['click', 'keydown', 'scroll', 'mousemove', 'focus'].forEach(type => {
+            window.addEventListener(type, reportActivity, {capture: true, passive: true});
+        });
+        document.addEventListener('visibilitychange', () => {
+            if (!document.hidden) reportActivity();
+        });
+        
+        socket.on('user_list', (data) => {
+            displayUsers(data.users);
+        });
+        
+        socket.on('receive_message', (data) => {
+            if (data.sender_id === selectedUserId || data.receiver_id === selectedUserId) {
+                displayNewMessage(data);
+            }
+            loadUsers(); // Refresh user list to update last messages
+        });
+        
+        socket.on('user_typing', (data) => {
+            if (data.user_id === selectedUserId) {
+                document.getElementById('typingIndicator').style.display = 'block';
+            }
+        });
+        
+        socket.on('user_stopped_typing', (data) => {
+            if (data.user_id === selectedUserId) {
+                document.getElementById('typingIndicator').style.display = 'none';
+            }
+        });
+        
+        function displayUsers(users) {
+            const usersList = document.getElementById('usersList');
+            usersList.innerHTML = '';
+            
+            users.forEach(user => {
+                if (user.id !== currentUserId) {
+                    const userItem = document.createElement('div');
+                    userItem.className = 'user-item' + (user.id === selectedUserId ? ' active' : '');
+                    userItem.onclick = () => selectUser(user.id, user.username);
+                    
+                    const initial = user.username.charAt(0).toUpperCase();
+                    let unreadBadge = user.unread_count > 0 ? `<div class="unread-badge">${user.unread_count}</div>` : '';
+                    
+                    userItem.innerHTML = `
+                        <div class="avatar">${initial}</div>
+                        <div class="user-info-text">
+                            <div class="username">${user.username}</div>
+                            <div class="status">online</div>
+                        </div>
+                        ${unreadBadge}
+                    `;
+                    
+                    usersList.appendChild(userItem);
+                }
+            });
+        }
+        
+        function loadUsers() {
+            fetch('/api/users')
+                .then(r => r.json())
+                .then(data => displayUsers(data.users));
+        }
+        
+        async function selectUser(userId, username) {
+            selectedUserId = userId;
+            
+            document.getElementById('welcomeScreen').style.display = 'none';
+            document.getElementById('chatContainer').style.display = 'flex';
+            
+            const initial = username.charAt(0).toUpperCase();
+            document.getElementById('chatHeaderAvatar').textContent = initial;
+            document.getElementById('chatHeaderName').textContent = username;
+            
+            // Mark messages as read
+            await fetch('/api/mark_read', {
+                method: 'POST',
+                headers: {'Content-Type': 'application/json'},
+                body: JSON.stringify({user_id: userId})
+            });
+            
+            loadMessages(userId);
+            loadUsers(); // Refresh to clear unread badges
+            
+            document.querySelectorAll('.user-item').forEach(item => {
+                item.classList.remove('active');
+            });
+            event.target.closest('.user-item').classList.add('active');
+        }
+        
+        function loadMessages(userId) {
+            fetch(`/api/messages/${userId}?limit=${messageLimit}`)
+                .then(r => r.json())
+                .then(data => {
+                    const messagesArea = document.getElementById('messagesArea');
+                    messagesArea.innerHTML = '';
+                    oldestMessageId = null;
+                    
+                    data.messages.forEach(msg => {
+                        displayNewMessage(msg);
+                    });
+                    updateLoadOlder(data.messages);
+                    
+                    messagesArea.scrollTop = messagesArea.scrollHeight;
+                });
+        }
+        
+        function loadOlderMessages() {
+            const userId = selectedUserId;
+            fetch(`/api/messages/${userId}?limit=${messageLimit}&before=${oldestMessageId}`)
+                .then(r => r.json())
+                .then(data => {
+                    if (userId !== selectedUserId) return;
+                    
+                    const messagesArea = document.getElementById('messagesArea');
+                    const button = document.getElementById('loadOlderBtn');
+                    const anchor = button ? button.nextSibling : messagesArea.firstChild;
+                    const previousHeight = messagesArea.scrollHeight;
+                    
+                    data.messages.forEach(msg => {
+                        messagesArea.insertBefore(createMessageElement(msg), anchor);
+                    });
+                    updateLoadOlder(data.messages);
+                    
+                    // Keep the messages the user was reading in place
+                    messagesArea.scrollTop += messagesArea.scrollHeight - previousHeight;
+                });
+        }
+        
+        function updateLoadOlder(messages) {
+            if (messages.length > 0) {
+                oldestMessageId = messages[0].id;
+            }
+            
+            // A full page means the server may have older messages
+            let button = document.getElementById('loadOlderBtn');
+            if (messages.length < messageLimit) {
+                if (button) button.remove();
+            } else if (!button) {
+                button = document.createElement('button');
+                button.id = 'loadOlderBtn';
+                button.className = 'load-older-btn';
+                button.textContent = 'Load older messages';
+                button.onclick = loadOlderMessages;
+                document.getElementById('messagesArea').prepend(button);
+            }
+        }
+        
+        function displayNewMessage(msg) {
+            const messagesArea = document.getElementById('messagesArea');
+            messagesArea.appendChild(createMessageElement(msg));
+            messagesArea.scrollTop = messagesArea.scrollHeight;
+        }
+        
+        function createMessageElement(msg) {
+            const messageDiv = document.createElement('div');
+            const isSent = msg.sender_id === currentUserId;
+            
+            messageDiv.className = `message ${isSent ? 'sent' : 'received'}`;
+            messageDiv.innerHTML = `
+                <div class="message-bubble">
+                    <div class="message-text">${escapeHtml(msg.content)}</div>
+                    <div class="message-time">${msg.time}</div>
+                </div>
+            `;
+            return messageDiv;
+        }
+        
+        function sendMessage() {
+            const input = document.getElementById('messageInput');
+            const text = input.value.trim();
+            
+            if (!text || !selectedUserId) return;
+            
+            socket.emit('send_message', {
+                receiver_id: selectedUserId,
+                content: text
+            });
+            
+            input.value = '';
+        }
+        
+        function handleKeyPress(event) {
+            if (event.key === 'Enter') {
+                sendMessage();
+            }
+        }
+        
+        function handleTyping() {
+            if (!selectedUserId) return;
+            
+            socket.emit('typing', {receiver_id: selectedUserId});
+            
+            clearTimeout(typingTimeout);
+            typingTimeout = setTimeout(() => {
+                socket.emit('stopped_typing', {receiver_id: selectedUserId});
+            }, 1000);
+        }
+        
+        function filterUsers() {
+            const searchText = document.getElementById('searchInput').value.toLowerCase();
+            const userItems = document.querySelectorAll('.user-item');
+            
+            userItems.forEach(item => {
+                const username = item.querySelector('.username').textContent.toLowerCase();
+                item.style.display = username.includes(searchText) ? 'flex' : 'none';
+            });
+        }
+        
+        function logout() {
+            window.location.href = '/logout';
+        }
+        
+        function escapeHtml(text) {
+            const div = document.createElement('div');
+            div.textContent = text;
+            return div.innerHTML;
+        }
+    </script>
+</body>
+</html>
+'''
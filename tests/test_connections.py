@@ -0,0 +1,132 @@
+import asyncio
+import queue
+import time
+
+from connections import AsyncSendQueue, ConnectionTracker, SendQueue
+
+
+class FakePacket:
+    def __init__(self, data):
+        self.data = data
+
+    def encode(self):
+        return '4' + self.data
+
+
+def age(tracker, sid, seconds, field='connected_at'):
+    tracker.connections[sid][field] = time.time() - seconds
+
+
+def test_cap_evicts_oldest_sockets_of_that_user():
+    tracker = ConnectionTracker(max_per_user=2)
+    assert tracker.add('a1', 1) == []
+    assert tracker.add('b1', 2) == []
+    assert tracker.add('a2', 1) == []
+
+    assert tracker.add('a3', 1) == ['a1']
+
+    assert tracker.by_user == {1: ['a2', 'a3'], 2: ['b1']}
+    assert set(tracker.connections) == {'a2', 'a3', 'b1'}
+    assert tracker.evicted == 1
+
+
+def test_anonymous_sockets_are_not_capped():
+    tracker = ConnectionTracker(max_per_user=1)
+
+    assert tracker.add('x', None) == []
+    assert tracker.add('y', None) == []
+    assert tracker.report()['anonymous'] == 2
+
+
+def test_remove_after_evict_is_a_no_op():
+    tracker = ConnectionTracker(max_per_user=1)
+    tracker.add('a1', 1)
+    tracker.add('a2', 1)
+
+    # The evicted socket's disconnect handler still runs
+    tracker.remove('a1')
+
+    assert tracker.by_user == {1: ['a2']}
+    tracker.remove('a2')
+    assert tracker.by_user == {}
+    assert tracker.connections == {}
+
+
+def test_idle_returns_and_forgets_quiet_connections():
+    tracker = ConnectionTracker(idle_timeout=60)
+    tracker.add('quiet', 1)
+    tracker.add('busy', 1)
+    age(tracker, 'quiet', 120, 'last_seen')
+    age(tracker, 'busy', 120, 'last_seen')
+    tracker.touch('busy')
+
+    assert tracker.idle() == ['quiet']
+
+    assert set(tracker.connections) == {'busy'}
+    assert tracker.by_user == {1: ['busy']}
+    assert tracker.idle_disconnects == 1
+    assert tracker.idle() == []
+
+
+def test_idle_disabled():
+    tracker = ConnectionTracker(idle_timeout=0)
+    tracker.add('a', 1)
+    age(tracker, 'a', 10 ** 6, 'last_seen')
+
+    assert tracker.idle() == []
+
+
+def test_report_age_buckets():
+    tracker = ConnectionTracker()
+    for sid, seconds in [('a', 5), ('b', 59), ('c', 300), ('d', 1800), ('e', 7200), ('f', 86400)]:
+        tracker.add(sid, 1)
+        age(tracker, sid, seconds)
+
+    assert tracker.report()['age'] == {'<1m': 2, '1-10m': 1, '10-60m': 1, '1-6h': 1, '>6h': 1}
+
+
+def test_report_lists_largest_send_queues():
+    tracker = ConnectionTracker()
+    for sid in 'abc':
+        tracker.add(sid, 1)
+    queued = {'a': 10, 'b': 0, 'c': 30}
+
+    report = tracker.report(queued.get)
+
+    assert report['queued_bytes'] == 40
+    assert report['top_queued'] == [
+        {'sid': 'c', 'user_id': 1, 'bytes': 30},
+        {'sid': 'a', 'user_id': 1, 'bytes': 10},
+    ]
+
+
+def test_send_queue_counts_bytes_until_taken():
+    send_queue = SendQueue(queue.Queue())
+    send_queue.put(FakePacket('hello'))
+    send_queue.put_nowait(FakePacket('hi'))
+    send_queue.put(None)
+    assert send_queue.bytes == 9
+
+    send_queue.get(timeout=1)
+    send_queue.task_done()
+    assert send_queue.bytes == 3
+    send_queue.get_nowait()
+    assert send_queue.bytes == 0
+    assert send_queue.get_nowait() is None
+    assert send_queue.bytes == 0
+    assert send_queue.empty()
+
+
+def test_async_send_queue_counts_bytes_until_taken():
+    async def run():
+        send_queue = AsyncSendQueue(asyncio.Queue())
+        await send_queue.put(FakePacket('hello'))
+        send_queue.put_nowait(FakePacket('hi'))
+        assert send_queue.bytes == 9
+
+        await asyncio.wait_for(send_queue.get(), 1)
+        assert send_queue.bytes == 3
+        send_queue.get_nowait()
+        return send_queue.bytes
+
+    assert asyncio.run(run()) == 0
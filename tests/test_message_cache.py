@@ -0,0 +1,153 @@
+import message_cache
+from message_cache import MESSAGE_OVERHEAD, MessageCache
+
+
+def message(id, content='hi'):
+    return {'id': id, 'sender_id': 1, 'receiver_id': 2, 'content': content, 'time': '10:00 AM'}
+
+
+def test_fill_complete_serves_any_read():
+    cache = MessageCache(per_conversation=3)
+    cache.fill(1, 2, [message(1), message(2)], True, cache.write_seq())
+
+    assert cache.get(2, 1) == [message(1), message(2)]
+    assert cache.get(1, 2, limit=1) == [message(2)]
+    assert cache.get(1, 2, limit=10) == [message(1), message(2)]
+
+
+def test_fill_longer_than_buffer_keeps_tail_only():
+    cache = MessageCache(per_conversation=2)
+    cache.fill(1, 2, [message(1), message(2), message(3)], True, cache.write_seq())
+
+    assert cache.get(1, 2) is None
+    assert cache.get(1, 2, limit=3) is None
+    assert cache.get(1, 2, limit=2) == [message(2), message(3)]
+
+
+def test_append_without_history_serves_only_what_it_has():
+    cache = MessageCache(per_conversation=5)
+    cache.append(1, 2, message(7))
+
+    assert cache.get(1, 2) is None
+    assert cache.get(1, 2, limit=1) == [message(7)]
+    assert cache.get(1, 2, limit=2) is None
+
+
+def test_overflow_drops_oldest_and_completeness():
+    cache = MessageCache(per_conversation=2)
+    cache.fill(1, 2, [message(1)], True, cache.write_seq())
+    cache.append(1, 2, message(2))
+    assert cache.get(1, 2) == [message(1), message(2)]
+
+    cache.append(1, 2, message(3))
+    assert cache.get(1, 2) is None
+    assert cache.get(1, 2, limit=2) == [message(2), message(3)]
+
+
+def test_fill_racing_a_write_is_discarded():
+    cache = MessageCache(per_conversation=5)
+    seq = cache.write_seq()
+    cache.append(1, 2, message(2))
+    # A database read taken before message 2 was written
+    cache.fill(1, 2, [message(1)], True, seq)
+
+    assert cache.get(1, 2, limit=1) == [message(2)]
+    assert cache.get(1, 2) is None
+
+
+def test_write_to_other_conversation_keeps_fill():
+    cache = MessageCache(per_conversation=5)
+    seq = cache.write_seq()
+    cache.append(1, 3, message(2))
+    cache.fill(1, 2, [message(1)], True, seq)
+
+    assert cache.get(1, 2) == [message(1)]
+
+
+def test_fill_after_forgotten_write_is_discarded(monkeypatch):
+    monkeypatch.setattr(message_cache, 'MAX_WRITE_KEYS', 2)
+    cache = MessageCache(per_conversation=5)
+    seq = cache.write_seq()
+    cache.append(1, 2, message(2))
+    cache.append(1, 3, message(3))
+    cache.append(1, 4, message(4))
+    # The write to (1, 2) is no longer tracked, so the fill is not trusted
+    cache.fill(1, 2, [message(1)], True, seq)
+
+    assert cache.get(1, 2) is None
+    cache.fill(1, 5, [message(5)], True, cache.write_seq())
+    assert cache.get(1, 5) == [message(5)]
+
+
+def test_duplicate_append_is_ignored():
+    cache = MessageCache(per_conversation=5)
+    cache.fill(1, 2, [message(1)], True, cache.write_seq())
+    cache.append(1, 2, message(2))
+    cache.append(2, 1, message(2))
+
+    assert cache.get(1, 2) == [message(1), message(2)]
+
+
+def test_late_append_keeps_id_order():
+    cache = MessageCache(per_conversation=5)
+    cache.fill(1, 2, [message(5), message(6)], True, cache.write_seq())
+    cache.append(1, 2, message(8))
+    # Relayed from another worker after the local write of message 8
+    cache.append(2, 1, message(7))
+
+    assert [m['id'] for m in cache.get(1, 2)] == [5, 6, 7, 8]
+
+
+def test_late_append_to_full_buffer_keeps_latest():
+    cache = MessageCache(per_conversation=3)
+    cache.fill(1, 2, [message(4), message(5)], True, cache.write_seq())
+    cache.append(1, 2, message(7))
+    cache.append(1, 2, message(6))
+    assert [m['id'] for m in cache.get(1, 2, limit=3)] == [5, 6, 7]
+
+    cache.append(1, 2, message(3))
+    assert [m['id'] for m in cache.get(1, 2, limit=3)] == [5, 6, 7]
+    assert cache.get(1, 2) is None
+
+
+def test_lru_evicts_least_recently_used_conversation():
+    cache = MessageCache(max_conversations=2)
+    cache.fill(1, 2, [message(1)], True, cache.write_seq())
+    cache.fill(1, 3, [message(2)], True, cache.write_seq())
+    cache.get(1, 2)
+    cache.fill(1, 4, [message(3)], True, cache.write_seq())
+
+    assert cache.get(1, 3) is None
+    assert cache.get(1, 2) == [message(1)]
+    assert cache.stats()['evictions'] == 1
+
+
+def test_byte_cap_evicts():
+    cache = MessageCache(max_bytes=2 * (MESSAGE_OVERHEAD + 10))
+    cache.fill(1, 2, [message(1, 'x' * 10)], True, cache.write_seq())
+    cache.fill(1, 3, [message(2, 'x' * 10)], True, cache.write_seq())
+    cache.append(1, 4, message(3, 'x' * 10))
+
+    stats = cache.stats()
+    assert stats['conversations'] == 2
+    assert stats['estimated_bytes'] <= cache.max_bytes
+    assert cache.get(1, 2) is None
+
+
+def test_disabled_cache_never_hits():
+    cache = MessageCache(max_conversations=0)
+    cache.fill(1, 2, [message(1)], True, cache.write_seq())
+    cache.append(1, 2, message(2))
+
+    assert cache.get(1, 2) is None
+    assert cache.get(1, 2, limit=1) is None
+
+
+def test_stats_hit_rate():
+    cache = MessageCache()
+    cache.get(1, 2)
+    cache.fill(1, 2, [message(1)], True, cache.write_seq())
+    cache.get(1, 2)
+
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['hit_rate']) == (1, 1, 0.5)
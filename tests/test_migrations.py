@@ -0,0 +1,116 @@
+import contextlib
+import io
+import multiprocessing
+
+from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Index, Integer, MetaData, String, Table, Text, create_engine, inspect, text
+
+import migrations
+from shards import shard_metadata
+
+
+# Mirrors the app tables without importing Flask
+def chat_metadata(indexes=True):
+    metadata = MetaData()
+    Table(
+        'user', metadata,
+        Column('id', Integer, primary_key=True),
+        Column('username', String(80), unique=True, nullable=False),
+    )
+    message = Table(
+        'message', metadata,
+        Column('id', Integer, primary_key=True),
+        Column('sender_id', Integer, ForeignKey('user.id'), nullable=False),
+        Column('receiver_id', Integer, ForeignKey('user.id'), nullable=False),
+        Column('content', Text, nullable=False),
+        Column('timestamp', DateTime),
+        Column('read', Boolean, default=False),
+    )
+    if indexes:
+        Index('ix_message_conversation', message.c.sender_id, message.c.receiver_id, message.c.timestamp)
+        Index('ix_message_unread', message.c.receiver_id, message.c.sender_id, message.c.read)
+    return metadata
+
+
+def version(engine):
+    with engine.connect() as conn:
+        return migrations.current_version(conn)
+
+
+def index_names(engine):
+    return {i['name'] for i in inspect(engine).get_indexes('message')}
+
+
+def run_upgrade(url):
+    # Runs in a separate process; returns what it printed
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        migrations.upgrade(create_engine(url), chat_metadata())
+    return output.getvalue()
+
+
+def test_fresh_database_gets_latest_schema(tmp_path):
+    engine = create_engine(f'sqlite:///{tmp_path}/chat.db')
+
+    assert migrations.upgrade(engine, chat_metadata()) == migrations.latest_version()
+
+    assert {'user', 'message', 'schema_version'} <= set(inspect(engine).get_table_names())
+    assert index_names(engine) == {'ix_message_conversation', 'ix_message_unread'}
+    assert version(engine) == migrations.latest_version()
+
+
+def test_pre_migration_database_gets_indexes(tmp_path):
+    engine = create_engine(f'sqlite:///{tmp_path}/chat.db')
+    # A database created by create_all() before migrations existed
+    chat_metadata(indexes=False).create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO user (id, username) VALUES (1, 'a'), (2, 'b')"))
+        conn.execute(text("INSERT INTO message (sender_id, receiver_id, content) VALUES (1, 2, 'hi')"))
+    assert index_names(engine) == set()
+
+    migrations.upgrade(engine, chat_metadata())
+
+    assert index_names(engine) == {'ix_message_conversation', 'ix_message_unread'}
+    assert version(engine) == migrations.latest_version()
+    with engine.connect() as conn:
+        assert conn.execute(text('SELECT content FROM message')).scalars().all() == ['hi']
+
+
+def test_rerun_is_a_no_op(tmp_path, capsys):
+    engine = create_engine(f'sqlite:///{tmp_path}/chat.db')
+    migrations.upgrade(engine, chat_metadata())
+    capsys.readouterr()
+
+    assert migrations.upgrade(engine, chat_metadata()) == migrations.latest_version()
+
+    assert capsys.readouterr().out == ''
+    with engine.connect() as conn:
+        assert conn.execute(text('SELECT count(*) FROM schema_version')).scalar() == 1
+
+
+def test_shard_runs_only_shard_migrations(tmp_path, monkeypatch):
+    applied = []
+    app_only = (migrations.latest_version('app') + 1, 'users only', lambda conn, metadata: applied.append('app'))
+    monkeypatch.setitem(migrations.MIGRATIONS, 'app', migrations.MIGRATIONS['app'] + [app_only])
+    engine = create_engine(f'sqlite:///{tmp_path}/chat_shard_0.db')
+    shard = shard_metadata(chat_metadata().tables['message'])
+
+    assert migrations.upgrade(engine, shard, 'shard') == migrations.latest_version('shard')
+
+    assert applied == []
+    assert set(inspect(engine).get_table_names()) == {'message', 'schema_version'}
+    assert index_names(engine) == {'ix_message_conversation', 'ix_message_unread'}
+    assert version(engine) == migrations.latest_version('shard')
+
+
+def test_concurrent_runs_apply_each_migration_once(tmp_path):
+    url = f'sqlite:///{tmp_path}/chat.db'
+    with multiprocessing.get_context('fork').Pool(6) as pool:
+        outputs = pool.map(run_upgrade, [url] * 6)
+
+    applied = ''.join(outputs)
+    for number, _, _ in migrations.MIGRATIONS['app']:
+        assert applied.count(f'Applied migration {number}:') == 1
+    engine = create_engine(url)
+    assert version(engine) == migrations.latest_version()
+    with engine.connect() as conn:
+        assert conn.execute(text('SELECT count(*) FROM schema_version')).scalar() == 1
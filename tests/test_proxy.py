@@ -0,0 +1,80 @@
+from proxy import rewrite, route
+
+
+class FakeWorker:
+    def __init__(self, index, alive=True, healthy=True, connections=0):
+        self.index = index
+        self._alive = alive
+        self.healthy = healthy
+        self.connections = connections
+
+    def alive(self):
+        return self._alive
+
+
+def workers(*specs):
+    return [FakeWorker(i, **spec) for i, spec in enumerate(specs)]
+
+
+def test_session_sticks_to_its_worker():
+    pool = workers({'connections': 5}, {'connections': 0})
+
+    assert route(pool, '/socket.io/?EIO=4&transport=polling&sid=0.abc').index == 0
+    assert route(pool, '/socket.io/?EIO=4&transport=websocket&sid=1.xyz').index == 1
+
+
+def test_session_of_dead_or_unknown_worker_is_rerouted():
+    pool = workers({'alive': False}, {'connections': 3}, {'connections': 1})
+
+    assert route(pool, '/socket.io/?sid=0.abc').index == 2
+    assert route(pool, '/socket.io/?sid=7.abc').index == 2
+    assert route(pool, '/socket.io/?sid=abc').index == 2
+
+
+def test_new_requests_go_to_least_busy_healthy_worker():
+    pool = workers({'connections': 4}, {'connections': 1, 'healthy': False}, {'connections': 2})
+
+    assert route(pool, '/socket.io/?EIO=4&transport=polling').index == 2
+    assert route(pool, '/chat').index == 2
+
+
+def test_unhealthy_workers_used_when_no_healthy_one():
+    pool = workers({'healthy': False, 'connections': 3}, {'healthy': False, 'connections': 1})
+
+    assert route(pool, '/').index == 1
+
+
+def test_no_live_worker():
+    assert route(workers({'alive': False}), '/') is None
+
+
+def test_worker_parameter_pins_request():
+    pool = workers({'connections': 0}, {'connections': 9}, {'alive': False})
+
+    assert route(pool, '/admin/cache?worker=1').index == 1
+    assert route(pool, '/admin/diagnostics/profile?reset=1&worker=1').index == 1
+    # A named worker that is down or missing is not replaced by another one
+    assert route(pool, '/admin/cache?worker=2') is None
+    assert route(pool, '/admin/cache?worker=5') is None
+    assert route(pool, '/admin/cache?worker=x') is None
+
+
+def test_rewrite_closes_plain_requests():
+    data = b'GET /chat HTTP/1.1\r\nHost: x\r\nConnection: keep-alive\r\n\r\nbody'
+
+    assert rewrite(data) == b'GET /chat HTTP/1.1\r\nHost: x\r\nConnection: close\r\n\r\nbody'
+
+
+def test_rewrite_adds_connection_close():
+    data = b'GET / HTTP/1.1\r\nHost: x\r\n\r\n'
+
+    assert rewrite(data) == b'GET / HTTP/1.1\r\nHost: x\r\nConnection: close\r\n\r\n'
+
+
+def test_rewrite_keeps_websocket_upgrade():
+    data = (
+        b'GET /socket.io/?EIO=4&transport=websocket&sid=0.abc HTTP/1.1\r\n'
+        b'Host: x\r\nConnection: Upgrade\r\nUpgrade: websocket\r\n\r\n'
+    )
+
+    assert rewrite(data) == data
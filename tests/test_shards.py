@@ -0,0 +1,129 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Index, Integer, String, Text, create_engine, inspect, text
+from sqlalchemy.orm import declarative_base
+
+from shards import MessageShards, rebalance
+
+Base = declarative_base()
+
+
+# Mirrors the app models without importing Flask
+class User(Base):
+    __tablename__ = 'user'
+    id = Column(Integer, primary_key=True)
+    username = Column(String(80), unique=True, nullable=False)
+
+
+class Message(Base):
+    __tablename__ = 'message'
+    id = Column(Integer, primary_key=True)
+    sender_id = Column(Integer, ForeignKey('user.id'), nullable=False)
+    receiver_id = Column(Integer, ForeignKey('user.id'), nullable=False)
+    content = Column(Text, nullable=False)
+    timestamp = Column(DateTime, default=datetime.utcnow)
+    read = Column(Boolean, default=False)
+
+    __table_args__ = (
+        Index('ix_message_conversation', 'sender_id', 'receiver_id', 'timestamp'),
+        Index('ix_message_unread', 'receiver_id', 'sender_id', 'read'),
+    )
+
+
+@pytest.fixture
+def shards(tmp_path):
+    shards = MessageShards([f'sqlite:///{tmp_path}/shard_{i}.db' for i in range(3)], Message)
+    shards.upgrade()
+    return shards
+
+
+def insert(engine, messages):
+    with engine.begin() as conn:
+        conn.execute(Message.__table__.insert(), [
+            {'sender_id': a, 'receiver_id': b, 'content': f'{a}->{b} #{n}', 'timestamp': datetime(2024, 1, 1), 'read': False}
+            for n, (a, b) in enumerate(messages)
+        ])
+
+
+def contents(engine):
+    with engine.connect() as conn:
+        return sorted(conn.execute(text('SELECT content FROM message')).scalars())
+
+
+def test_shard_for_is_symmetric_and_stable(shards):
+    assert shards.shard_for(1, 2) == shards.shard_for(2, 1)
+    assert shards.shard_for('7', 3) == shards.shard_for(3, 7)
+    # crc32 of "1:2" and "3:7" modulo 3; must not change between releases
+    assert shards.shard_for(1, 2) == 0
+    assert shards.shard_for(3, 7) == 1
+
+
+def test_shard_for_spreads_conversations(shards):
+    used = {shards.shard_for(a, b) for a in range(1, 20) for b in range(a + 1, 20)}
+    assert used == {0, 1, 2}
+
+
+def test_shards_hold_only_message_table(shards):
+    inspector = inspect(shards.engines[0])
+    assert set(inspector.get_table_names()) == {'message', 'schema_version'}
+    assert inspector.get_foreign_keys('message') == []
+    assert {i['name'] for i in inspector.get_indexes('message')} == {'ix_message_conversation', 'ix_message_unread'}
+
+    with shards.engines[0].begin() as conn:
+        conn.exec_driver_sql('PRAGMA foreign_keys=ON')
+        conn.execute(Message.__table__.insert(), {'sender_id': 1, 'receiver_id': 2, 'content': 'hi', 'read': False})
+
+
+def test_unread_counts_sum_over_shards(shards):
+    for a in (1, 3, 4):
+        with shards.session(a, 2) as s:
+            s.add_all([Message(sender_id=a, receiver_id=2, content='x') for _ in range(a)])
+            s.commit()
+
+    assert shards.unread_counts(2) == {1: 1, 3: 3, 4: 4}
+
+
+def test_rebalance_moves_each_conversation_to_its_shard(tmp_path, shards):
+    source = create_engine(f'sqlite:///{tmp_path}/chat.db')
+    Base.metadata.create_all(source)
+    pairs = [(a, b) for a in range(1, 6) for b in range(1, 6) if a != b]
+    insert(source, pairs)
+    expected = contents(source)
+
+    moved, kept = rebalance(source, shards.engines, shards.shard_for, batch_size=7)
+
+    assert (moved, kept) == (len(pairs), 0)
+    assert contents(source) == []
+    assert sorted(sum((contents(e) for e in shards.engines), [])) == expected
+    for index, engine in enumerate(shards.engines):
+        with engine.connect() as conn:
+            for a, b in conn.execute(text('SELECT sender_id, receiver_id FROM message')):
+                assert shards.shard_for(a, b) == index
+
+    # Re-running finds everything in place
+    assert rebalance(shards.engines[0], shards.engines, shards.shard_for) == (0, len(contents(shards.engines[0])))
+
+
+def test_rebalance_batch_is_atomic(tmp_path, shards):
+    source = create_engine(f'sqlite:///{tmp_path}/chat.db')
+    Base.metadata.create_all(source)
+    insert(source, [(1, 2), (3, 7)])
+    # Break one target so its batch fails
+    broken = shards.shard_for(1, 2)
+    with shards.engines[broken].begin() as conn:
+        conn.exec_driver_sql('DROP TABLE message')
+
+    with pytest.raises(Exception):
+        rebalance(source, shards.engines, shards.shard_for)
+
+    # Nothing was lost, and the failed batch was not half applied
+    remaining = contents(source)
+    assert '1->2 #0' in remaining
+    moved = sum((contents(e) for i, e in enumerate(shards.engines) if i != broken), [])
+    assert sorted(remaining + moved) == ['1->2 #0', '3->7 #1']
+
+
+def test_rebalance_requires_sqlite_files(shards):
+    with pytest.raises(ValueError):
+        rebalance(create_engine('sqlite://'), shards.engines, shards.shard_for)